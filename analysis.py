@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+
+from baselines import WeeklyDeaths
+
+covidYears = [2020, 2021] # years compared to the baseline year
+vaccYears = [2021] # years compared to the second baseline year (deduced covid deaths)
+
+###############################################################################
+# calendar weeks
+###############################################################################
+
+def decode_kalw(codes):
+    """decode "KALW-YYYYWW" codes into (years, kws, times) arrays.
+
+    Same result as datetime.strptime(code+"1", "KALW-%Y%W%w") per row, including
+    the KW shift: last week of 2020 is assigned to 2021, weeks of 2021 move by one.
+    Only the unique codes are decoded, results are broadcast back to all rows.
+    """
+    inverse, uniques = pd.factorize(pd.Series(codes, dtype=object), sort=False)
+    uniques = np.asarray(uniques, dtype=str)
+    year = np.array([code[5:9] for code in uniques], dtype=np.int64)
+    kw = np.array([code[9:11] for code in uniques], dtype=np.int64)
+
+    # monday of week kw, with week 1 starting on the first monday of the year (%W)
+    jan1 = (year - 1970).astype("datetime64[Y]").astype("datetime64[D]")
+    jan1_weekday = (jan1.astype(np.int64) + 3) % 7 # 1970-01-01 was a thursday
+    week0_length = (7 - jan1_weekday) % 7
+    monday = jan1 + (week0_length + 7*(kw - 1)).astype("timedelta64[D]")
+
+    # due to KW issue, assign last week of 2020 to 2021
+    isLastKW2020 = (year == 2020) & (kw == 53)
+    is2021 = (year == 2021)
+    years = np.where(isLastKW2020, 2021, year)
+    kws = np.where(isLastKW2020, 1, np.where(is2021, kw + 1, kw))
+    times = monday + np.where(is2021, 14, 7).astype("timedelta64[D]")
+
+    return years[inverse], kws[inverse], times[inverse].astype("datetime64[ns]")
+
+def aggregate_weekly(data_mortalRate_df_filtered):
+    """weekly deaths (Year, KW, Time, F-ANZ-1), summed over all rows of a week."""
+    return data_mortalRate_df_filtered.groupby(["Year", "KW"], as_index=False, sort=True, observed=True) \
+        .agg(**{"F-ANZ-1": ("F-ANZ-1", "sum"), "Time": ("Time", "first")})[["F-ANZ-1", "Time", "KW", "Year"]]
+
+###############################################################################
+# covid deaths
+###############################################################################
+
+def _to_float_time(times):
+    # datetime64 in ns as float, the time axis used for interpolation
+    return np.asarray(times, dtype="datetime64[ns]").astype(np.int64).astype(float)
+
+def deduct_covid_deaths(times, deaths, covidTimes, covidDeathsCum):
+    """deduct covid deaths from weekly deaths.
+
+    covid deaths between two consecutive entries of times are taken from the linear
+    interpolation of the cumulated covid deaths and deducted from the deaths of the
+    later week, the first week is kept as it is. All week boundaries are interpolated
+    in one np.interp call.
+    """
+    deaths = np.asarray(deaths, dtype=int)
+    covidDeathsCumAtTimes = np.interp(_to_float_time(times), _to_float_time(covidTimes),
+                                      np.asarray(covidDeathsCum), left=0)
+    cleaned = np.empty(len(deaths), dtype=float)
+    cleaned[0:1] = deaths[0:1] #keep first value
+    cleaned[1:] = deaths[1:] - np.diff(covidDeathsCumAtTimes)
+    return cleaned
+
+def covid_deaths_cum(data_covidCases_df_filtered):
+    """cumulated covid deaths per day, summed over all rows of a day."""
+    return data_covidCases_df_filtered.groupby("Time", as_index=False, sort=True, observed=True) \
+        .agg(CovidDeathsCum=("AnzahlTot", "sum"))
+
+def covid_deaths_by_age(data_covidCases_df_filtered):
+    """cumulated covid deaths per age group at the last day."""
+    return data_covidCases_df_filtered.loc[data_covidCases_df_filtered["Time"] == data_covidCases_df_filtered["Time"].max()] \
+        .groupby("AltersgruppeID", sort=True, observed=True) \
+        .agg(Altersgruppe=("Altersgruppe", "first"), AnzahlTot=("AnzahlTot", "sum")).reset_index(drop=True)
+
+def add_covid_deduced(data_mortalRate_df_filtered, covidDeathsCum_df):
+    """copy of the weekly deaths with added column F_ANZ_cleanedByCovidDeaths."""
+    data_mortalRate_df_filtered = data_mortalRate_df_filtered.copy()
+    data_mortalRate_df_filtered["F_ANZ_cleanedByCovidDeaths"] = deduct_covid_deaths(data_mortalRate_df_filtered["Time"],
+                                                                                 data_mortalRate_df_filtered["F-ANZ-1"],
+                                                                                 covidDeathsCum_df["Time"],
+                                                                                 covidDeathsCum_df["CovidDeathsCum"])
+    return data_mortalRate_df_filtered
+
+###############################################################################
+# excess mortality
+###############################################################################
+
+def year_rows(years, selectedYears):
+    """slice of the rows of selectedYears in years, which has to be sorted.
+
+    Indexing arrays or frames with it gives views instead of copies.
+    """
+    years = np.asarray(years)
+    return slice(np.searchsorted(years, min(selectedYears), side="left"), np.searchsorted(years, max(selectedYears), side="right"))
+
+def _rows_frame(df, rows, columns, **added):
+    # frame of rows (a slice) and columns of df on views of its column arrays, with added columns
+    data = {column: df[column].to_numpy()[rows] for column in columns}
+    data.update(added)
+    return pd.DataFrame(data, index=df.index[rows], copy=False)
+
+def _continue_cumsum(excess, previous):
+    # cumsum of excess, values before the first changed excess value are taken from previous
+    if previous is None:
+        return excess.cumsum()
+    oldExcess, oldCum = previous
+    n = min(len(excess), len(oldExcess))
+    changed = np.flatnonzero(excess[:n] != oldExcess[:n])
+    start = changed[0] if len(changed) else n
+    if start == 0:
+        return excess.cumsum()
+    cum = np.empty(len(excess), dtype=np.result_type(oldCum, excess))
+    cum[:start] = oldCum[:start]
+    cum[start:] = np.cumsum(np.concatenate([oldCum[start-1:start], excess[start:]]))[1:]
+    return cum
+
+def excess_frames(data_mortalRate_df_filtered, mortalityBaselineYear, mortalityBaselineYear_2, previous=None, store=None):
+    """cumulated excess mortality of covid years and of the vaccination year.
+
+    Returns (covid years, vaccination year, excess). Covid years are compared to the raw
+    deaths of mortalityBaselineYear, the vaccination year to the deaths with deduced covid
+    deaths of mortalityBaselineYear_2, a baseline year or a baselines.Baseline, week by week.
+    excess holds the weekly excess and its cumsum, passed as previous to a later call only the
+    cumsum after the first changed week is computed. store is the baselines.WeeklyDeaths of
+    the weekly deaths, if already built.
+    """
+    previous = previous or {}
+    store = store or WeeklyDeaths.from_frame(data_mortalRate_df_filtered)
+    years = data_mortalRate_df_filtered["Year"].to_numpy()
+    kws = data_mortalRate_df_filtered["KW"].to_numpy()
+    mortal = data_mortalRate_df_filtered["F-ANZ-1"].to_numpy()
+    mortalCleaned = data_mortalRate_df_filtered["F_ANZ_cleanedByCovidDeaths"].to_numpy()
+    # weeks are sorted by year, all subsets are slices of the weekly rows
+    covidRows = year_rows(years, covidYears)
+    vaccRows = year_rows(years, vaccYears)
+
+    excessmortal = mortal[covidRows] - store.baseline_weeks(mortalityBaselineYear, years[covidRows], kws[covidRows])
+    data_mortalRate_df_filtered_CovidYears = _rows_frame(data_mortalRate_df_filtered, covidRows,
+                                                         [column for column in data_mortalRate_df_filtered.columns if column != "F_ANZ_cleanedByCovidDeaths"],
+                                                         excessmortalCum=_continue_cumsum(excessmortal, previous.get("CovidYears")))
+
+    excessmortal2 = mortalCleaned[vaccRows] - store.baseline_weeks(mortalityBaselineYear_2, years[vaccRows], kws[vaccRows],
+                                                                   "F_ANZ_cleanedByCovidDeaths")
+    data_mortalRate_df_filtered_vaccYear = _rows_frame(data_mortalRate_df_filtered, vaccRows, data_mortalRate_df_filtered.columns,
+                                                       excessmortalCum=_continue_cumsum(excessmortal2, previous.get("vaccYear")))
+
+    excess = {"CovidYears": (excessmortal, data_mortalRate_df_filtered_CovidYears["excessmortalCum"].to_numpy()),
+              "vaccYear": (excessmortal2, data_mortalRate_df_filtered_vaccYear["excessmortalCum"].to_numpy())}
+    return data_mortalRate_df_filtered_CovidYears, data_mortalRate_df_filtered_vaccYear, excess
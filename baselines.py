@@ -0,0 +1,162 @@
+import warnings
+from dataclasses import dataclass
+
+import numpy as np
+
+weeksPerYear = 53 # calendar weeks are stored in KW 1..53, years with 52 weeks use KW 52 for KW 53
+statistics = ("mean", "median") # statistics of the weekly deaths of several years
+
+###############################################################################
+# baselines
+###############################################################################
+
+@dataclass(frozen=True)
+class Baseline:
+    """baseline of excess mortality, mean or median of the weekly deaths of several years.
+
+    years are calendar years, or with rolling=True offsets to each compared year,
+    e.g. Baseline(tuple(range(1, 6)), rolling=True) for the 5 previous years.
+    """
+    years: tuple
+    statistic: str = "mean" # "mean" or "median"
+    rolling: bool = False
+
+    def __str__(self):
+        years = f"{min(self.years)}-{max(self.years)}" if _is_range(self.years) else ",".join(map(str, self.years))
+        if self.rolling:
+            years = f"r{years}"
+        return years if self.statistic == "mean" else f"{self.statistic}:{years}"
+
+def _is_range(years):
+    return len(years) > 1 and tuple(sorted(years)) == tuple(range(min(years), max(years)+1))
+
+def as_baseline(baseline):
+    """Baseline of a baseline year (int), a Baseline is returned as it is."""
+    if isinstance(baseline, Baseline):
+        return baseline
+    return Baseline((int(baseline),))
+
+def parse_baseline(text):
+    """baseline of a command line value.
+
+    "2019" is a single year, "2015-2019" or "2015,2017" the mean of years, "r1-5" the mean
+    of the 5 years before each compared year. Prefix "median:" for the median instead.
+    A single year is returned as int.
+    """
+    statistic = "mean"
+    if ":" in text:
+        statistic, text = text.split(":", 1)
+        if statistic not in statistics:
+            raise ValueError(f"unknown baseline statistic {statistic}, one of {', '.join(statistics)}")
+    rolling = text.startswith("r")
+    text = text[1:] if rolling else text
+    if "-" in text:
+        first, last = text.split("-")
+        years = tuple(range(int(first), int(last)+1))
+    else:
+        years = tuple(int(year) for year in text.split(","))
+    if len(years) == 1 and statistic == "mean" and not rolling:
+        return years[0]
+    return Baseline(years, statistic, rolling)
+
+###############################################################################
+# weekly deaths store
+###############################################################################
+
+class WeeklyDeaths:
+    """weekly deaths of one stratum as arrays indexed by (year, KW), to compute baselines.
+
+    Built once from the weekly rows (Year, KW and value columns), every baseline is then
+    array arithmetic: single years are table rows, means of consecutive years differences
+    of prefix sums over the years, other baselines are computed once and kept.
+    Missing weeks are NaN, and a year without KW 53 uses its KW 52 for KW 53, so
+    53 week years are compared week by week to any baseline.
+    """
+
+    def __init__(self, years, kws, columns):
+        years = np.asarray(years)
+        kws = np.asarray(kws)
+        self.firstYear = int(years.min())
+        self.lastYear = int(years.max())
+        rows = years - self.firstYear
+        self.tables = {}
+        self.sums = {}
+        self.counts = {}
+        for name, values in columns.items():
+            table = np.full((self.lastYear - self.firstYear + 1, weeksPerYear), np.nan)
+            table[rows, kws - 1] = values
+            missingKW53 = np.isnan(table[:, weeksPerYear-1])
+            table[missingKW53, weeksPerYear-1] = table[missingKW53, weeksPerYear-2]
+            # prefix sums over the years, row i holds the sum of the years before firstYear+i
+            isValue = ~np.isnan(table)
+            self.tables[name] = table
+            self.sums[name] = np.concatenate([np.zeros((1, weeksPerYear)), np.cumsum(np.where(isValue, table, 0), axis=0)])
+            self.counts[name] = np.concatenate([np.zeros((1, weeksPerYear), dtype=int), np.cumsum(isValue, axis=0)])
+        self._baselines = {}
+
+    @classmethod
+    def from_frame(cls, data_mortalRate_df_filtered, columns=("F-ANZ-1", "F_ANZ_cleanedByCovidDeaths")):
+        """store of weekly deaths (see analysis.aggregate_weekly) with the given columns, if present."""
+        return cls(data_mortalRate_df_filtered["Year"].to_numpy(), data_mortalRate_df_filtered["KW"].to_numpy(),
+                   {column: data_mortalRate_df_filtered[column].to_numpy(dtype=float)
+                    for column in columns if column in data_mortalRate_df_filtered.columns})
+
+    def _rows(self, years):
+        rows = np.asarray(years) - self.firstYear
+        if ((rows < 0) | (rows > self.lastYear - self.firstYear)).any():
+            raise ValueError(f"no weekly deaths of years {years}, only of {self.firstYear}-{self.lastYear}")
+        return rows
+
+    def year(self, year, column="F-ANZ-1"):
+        """weekly deaths of year by KW-1."""
+        return self.tables[column][self._rows([year])[0]]
+
+    def mean(self, firstYear, lastYear, column="F-ANZ-1"):
+        """mean weekly deaths of the years firstYear..lastYear by KW-1, NaN for weeks without data."""
+        first, last = self._rows([firstYear, lastYear])
+        counts = self.counts[column][last+1] - self.counts[column][first]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, (self.sums[column][last+1] - self.sums[column][first]) / counts, np.nan)
+
+    def _statistic(self, years, statistic, column):
+        # statistic of weekly deaths over years (array), by KW-1
+        if len(years) == 1:
+            return self.year(years[0], column)
+        if statistic == "mean" and _is_range(years):
+            return self.mean(min(years), max(years), column)
+        rows = self.tables[column][self._rows(years)]
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning) # weeks without data in all years are NaN
+            if statistic == "mean":
+                return np.nanmean(rows, axis=0)
+            if statistic == "median":
+                return np.nanmedian(rows, axis=0)
+        raise ValueError(f"unknown baseline statistic {statistic}")
+
+    def baseline(self, baseline, column="F-ANZ-1"):
+        """baseline deaths by KW-1, or by (year-firstYear, KW-1) for rolling baselines."""
+        baseline = as_baseline(baseline)
+        key = (baseline, column)
+        if key not in self._baselines:
+            if baseline.rolling:
+                table = np.full(self.tables[column].shape, np.nan)
+                offsets = np.asarray(baseline.years)
+                for year in range(self.firstYear, self.lastYear + 1):
+                    if year - offsets.max() >= self.firstYear and year - offsets.min() <= self.lastYear:
+                        table[year - self.firstYear] = self._statistic(year - offsets, baseline.statistic, column)
+            else:
+                table = self._statistic(np.asarray(baseline.years), baseline.statistic, column)
+            self._baselines[key] = table
+        return self._baselines[key]
+
+    def baseline_weeks(self, baseline, years, kws, column="F-ANZ-1"):
+        """baseline deaths of the weeks (years, kws), matched by calendar week."""
+        table = self.baseline(baseline, column)
+        kwIndex = np.asarray(kws) - 1
+        if table.ndim == 2:
+            return table[self._rows(years), kwIndex]
+        return table[kwIndex]
+
+    def excess(self, baseline, years, kws, column="F-ANZ-1"):
+        """weekly deaths of the weeks (years, kws) minus their baseline deaths."""
+        return self.tables[column][self._rows(years), np.asarray(kws) - 1] - self.baseline_weeks(baseline, years, kws, column)
@@ -0,0 +1,186 @@
+import os
+import sys
+import itertools
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from analysis import covidYears, vaccYears, year_rows
+from baselines import WeeklyDeaths, Baseline
+from engine import AnalysisConfig, InputData, load_inputs, deduct_stage, regionNames, sexNames, covidAgeBands
+from instrumentation import stage
+
+###############################################################################
+# configurations
+###############################################################################
+
+def config_grid(regions=["BLWO-0"], sexes=["SEXWO-0"], ageGroups=[None], baselineYears=[2019], baselineYears_2=[2020]):
+    """all combinations of the given strata and baseline years as AnalysisConfig.
+
+    ageGroups are AltersgruppeIDs of the covid data, the matching 5 year bands of the
+    mortality data are taken from engine.covidAgeBands. None analyses all ages.
+    """
+    return [AnalysisConfig(region=region, sex=sex,
+                           ageBands=covidAgeBands[ageGroup] if ageGroup is not None else None,
+                           covidAgeGroupIds=(ageGroup,) if ageGroup is not None else None,
+                           mortalityBaselineYear=baselineYear, mortalityBaselineYear_2=baselineYear_2)
+            for region, sex, ageGroup, baselineYear, baselineYear_2
+            in itertools.product(regions, sexes, ageGroups, baselineYears, baselineYears_2)]
+
+###############################################################################
+# inputs in shared memory
+###############################################################################
+
+def _codes_dtype(categories):
+    # smallest signed integer type for codes of categories, as pandas chooses for categoricals
+    for dtype in [np.int8, np.int16, np.int32]:
+        if len(categories) < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+def _share_frames(frames):
+    # copy frames into one shared memory block, text columns are stored as integer codes
+    # in the dtype pandas uses for them, so pd.Categorical.from_codes does not copy them
+    columns = []
+    arrays = []
+    offset = 0
+    for frameName, df in frames.items():
+        for column in df.columns:
+            values = df[column]
+            categories = None
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                values, categories = values.cat.codes, list(values.cat.categories)
+            elif values.dtype == object:
+                codes, categories = pd.factorize(values)
+                values = codes.astype(_codes_dtype(categories))
+                categories = list(categories)
+            values = np.ascontiguousarray(values.to_numpy() if isinstance(values, pd.Series) else values)
+            columns.append((frameName, column, values.dtype.str, offset, len(values), categories))
+            arrays.append((offset, values))
+            offset += values.nbytes + (-values.nbytes % 8) # keep 8 byte alignment
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for start, values in arrays:
+        np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf, offset=start)[:] = values
+    return shm, columns
+
+def _attach_frames(shm, columns):
+    # read-only frames on the shared memory block, text columns as categoricals
+    frames = {}
+    for frameName, column, dtype, offset, length, categories in columns:
+        values = np.ndarray((length,), dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+        values.flags.writeable = False
+        if categories is not None:
+            values = pd.Categorical.from_codes(values, categories=categories)
+        frames.setdefault(frameName, {})[column] = values
+    return {frameName: pd.DataFrame(data, copy=False) for frameName, data in frames.items()}
+
+_shm = None
+_inputs = None
+
+def _init_worker(shm_name, columns):
+    global _shm, _inputs
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    frames = _attach_frames(_shm, columns)
+    _inputs = InputData(frames["data_mortalRate_df"], frames["data_covidCases_df"])
+
+###############################################################################
+# batch
+###############################################################################
+
+def _run_stratum(configs):
+    # stages 2-4 once per stratum, excess mortality for each baseline
+    return analyse_stratum(_inputs, configs)
+
+def _baseline_label(baseline):
+    # baseline years stay numbers in the table, other baselines are written as text
+    return baseline if isinstance(baseline, int) else str(baseline)
+
+def analyse_stratum(inputs, configs):
+    """tidy results of configurations that only differ in baselines.
+
+    One row per configuration and week of the covid years, with the deaths, the deaths
+    with deduced covid deaths and both cumulated excess mortalities. The weekly deaths
+    are stored once by (Year, KW), each baseline is array arithmetic on that store.
+    """
+    data_mortalRate_df_filtered, _, _ = deduct_stage(inputs, configs[0])
+    store = WeeklyDeaths.from_frame(data_mortalRate_df_filtered)
+    rows = year_rows(data_mortalRate_df_filtered["Year"].to_numpy(), covidYears)
+    weeks = {column: data_mortalRate_df_filtered[column].to_numpy()[rows]
+             for column in ["Year", "KW", "Time", "F-ANZ-1", "F_ANZ_cleanedByCovidDeaths"]}
+    years, kws = weeks["Year"], weeks["KW"]
+    isVaccYear = np.isin(years, vaccYears)
+
+    with stage("excess mortality") as s:
+        excessmortalCum = np.empty((len(configs), len(years)))
+        excessmortalCum_2 = np.full((len(configs), len(years)), np.nan)
+        for i, config in enumerate(configs):
+            excessmortalCum[i] = store.excess(config.mortalityBaselineYear, years, kws).cumsum()
+            excessmortalCum_2[i, isVaccYear] = store.excess(config.mortalityBaselineYear_2, years[isVaccYear], kws[isVaccYear],
+                                                            "F_ANZ_cleanedByCovidDeaths").cumsum()
+        s.rows = excessmortalCum.size
+
+    def per_config(values):
+        # object array if baseline years are mixed with baselines written as text, so years stay numbers
+        return np.repeat(np.array(values, dtype=object if len({type(value) for value in values}) > 1 else None), len(years))
+    result_df = pd.DataFrame({"region": per_config([config.region for config in configs]),
+                              "sex": per_config([config.sex for config in configs]),
+                              "ageBands": per_config([",".join(config.ageBands) if config.ageBands else "" for config in configs]),
+                              "covidAgeGroupIds": per_config([",".join(map(str, config.covidAgeGroupIds)) if config.covidAgeGroupIds else ""
+                                                              for config in configs]),
+                              "mortalityBaselineYear": per_config([_baseline_label(config.mortalityBaselineYear) for config in configs]),
+                              "mortalityBaselineYear_2": per_config([_baseline_label(config.mortalityBaselineYear_2) for config in configs])})
+    for column, values in weeks.items():
+        result_df[column] = np.tile(values, len(configs))
+    result_df["excessmortalCum"] = excessmortalCum.ravel()
+    result_df["excessmortalCum_2"] = excessmortalCum_2.ravel()
+    return result_df
+
+def run_batch(inputs, configs, processes=None):
+    """run all configurations on a process pool and return one tidy table.
+
+    The input frames are copied once into shared memory, workers only attach to it.
+    Configurations of the same stratum are run by the same task, so filtering,
+    aggregation and covid death deduction are done once per stratum.
+    """
+    strata = {}
+    for config in configs:
+        strata.setdefault((config.region, config.sex, config.ageBands, config.covidAgeGroupIds), []).append(config)
+    tasks = list(strata.values())
+    processes = min(processes or os.cpu_count(), len(tasks))
+    if processes <= 1:
+        results = [analyse_stratum(inputs, task) for task in tasks]
+    else:
+        shm, columns = _share_frames({"data_mortalRate_df": inputs.data_mortalRate_df,
+                                      "data_covidCases_df": inputs.data_covidCases_df})
+        try:
+            with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(shm.name, columns)) as pool:
+                results = pool.map(_run_stratum, tasks, chunksize=max(1, len(tasks) // (4*processes)))
+        finally:
+            shm.close()
+            shm.unlink()
+    return pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+
+###############################################################################
+# main
+###############################################################################
+
+if __name__ == "__main__":
+    # all states and sexes, and all age groups, each against several baselines
+    mortality_rate_file = "OGD_rate_kalwo_GEST_KALWOCHE_STR_100.csv"
+    mortality_rate_age_file = "OGD_gest_kalwo_alter_GEST_KALWOCHE_5J_100.csv"
+    covid_cases_file = "CovidFaelle_Altersgruppe.csv"
+    output_file = sys.argv[1] if len(sys.argv) > 1 else "batch_results.csv"
+    baselineYears = [2015, 2016, 2017, 2018, 2019,
+                     Baseline(tuple(range(2015, 2020))), # mean of 2015-2019
+                     Baseline(tuple(range(2015, 2020)), "median"),
+                     Baseline(tuple(range(1, 6)), rolling=True)] # mean of the 5 years before each year
+
+    results = []
+    results.append(run_batch(load_inputs(mortality_rate_file, covid_cases_file),
+                             config_grid(regions=list(regionNames), sexes=list(sexNames), baselineYears=baselineYears)))
+    if os.path.exists(mortality_rate_age_file):
+        results.append(run_batch(load_inputs(mortality_rate_age_file, covid_cases_file),
+                                 config_grid(ageGroups=list(covidAgeBands), baselineYears=baselineYears)))
+    pd.concat(results, ignore_index=True).to_csv(output_file, sep=";", index=False)
@@ -0,0 +1,62 @@
+import os
+import sys
+import timeit
+from collections import defaultdict
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from analysis import aggregate_weekly, covid_deaths_cum, covid_deaths_by_age
+from loading import parse_mortality_rate, parse_covid_cases
+
+###############################################################################
+# input
+###############################################################################
+
+mortality_rate_file = sys.argv[1] if len(sys.argv) > 1 else "OGD_gest_kalwo_alter_GEST_KALWOCHE_5J_100.csv"
+covid_cases_file = sys.argv[2] if len(sys.argv) > 2 else "CovidFaelle_Altersgruppe.csv"
+repeats = 3
+
+###############################################################################
+# main
+###############################################################################
+
+# aggregations as done by iterating groupby groups before
+def aggregate_weekly_loop(data_mortalRate_df_filtered):
+    mortalRate_filtered_dict = defaultdict(list)
+    for groupName, groupData in data_mortalRate_df_filtered.groupby(["Year","KW"]):
+        mortalRate_filtered_dict["F-ANZ-1"].append(groupData["F-ANZ-1"].sum())
+        mortalRate_filtered_dict["Time"].append(groupData["Time"].unique()[0])
+        mortalRate_filtered_dict["KW"].append(groupData["KW"].unique()[0])
+        mortalRate_filtered_dict["Year"].append(groupData["Year"].unique()[0])
+    return pd.DataFrame(mortalRate_filtered_dict)
+
+def covid_deaths_cum_loop(data_covidCases_df_filtered):
+    covidDeathsCum_dict = defaultdict(list)
+    for groupName, groupData in data_covidCases_df_filtered.groupby("Time"):
+        covidDeathsCum_dict["Time"].append(groupName)
+        covidDeathsCum_dict["CovidDeathsCum"].append(groupData["AnzahlTot"].sum())
+    return pd.DataFrame(covidDeathsCum_dict)
+
+def covid_deaths_by_age_loop(data_covidCases_df_filtered):
+    covidDeathsByAgeCum_dict = defaultdict(list)
+    for groupName, groupData in data_covidCases_df_filtered.loc[(data_covidCases_df_filtered["Time"].isin([data_covidCases_df_filtered["Time"].max()]))] \
+            .groupby("AltersgruppeID"):
+        covidDeathsByAgeCum_dict["Altersgruppe"].append(groupData["Altersgruppe"].unique()[0])
+        covidDeathsByAgeCum_dict["AnzahlTot"].append(groupData["AnzahlTot"].sum())
+    return pd.DataFrame(covidDeathsByAgeCum_dict)
+
+data_mortalRate_df = parse_mortality_rate(mortality_rate_file)
+data_covidCases_df = parse_covid_cases(covid_cases_file)
+data_covidCases_df_filtered = data_covidCases_df.loc[data_covidCases_df["Bundesland"]=="Österreich"]
+
+print(f"mortality rows: {len(data_mortalRate_df)}, covid rows: {len(data_covidCases_df_filtered)}")
+for name, loop, vectorized, data in [("weekly deaths", aggregate_weekly_loop, aggregate_weekly, data_mortalRate_df),
+                                     ("covid deaths per day", covid_deaths_cum_loop, covid_deaths_cum, data_covidCases_df_filtered),
+                                     ("covid deaths by age", covid_deaths_by_age_loop, covid_deaths_by_age, data_covidCases_df_filtered)]:
+    expected = loop(data)
+    # loops return plain values, code columns are categoricals now
+    pd.testing.assert_frame_equal(expected, vectorized(data)[expected.columns].astype(expected.dtypes.to_dict()), check_dtype=False)
+    t_loop = min(timeit.repeat(lambda: loop(data), number=1, repeat=repeats))
+    t_vect = min(timeit.repeat(lambda: vectorized(data), number=1, repeat=repeats))
+    print(f"{name:22s} groupby loop: {t_loop*1000:8.1f} ms, groupby().agg: {t_vect*1000:8.1f} ms (x{t_loop/t_vect:.1f})")
@@ -0,0 +1,57 @@
+import os
+import sys
+import timeit
+import itertools
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from analysis import covidYears
+from baselines import WeeklyDeaths, Baseline
+from engine import AnalysisConfig, load_inputs, deduct_stage
+
+###############################################################################
+# input
+###############################################################################
+
+mortality_rate_file = sys.argv[1] if len(sys.argv) > 1 else "OGD_rate_kalwo_GEST_KALWOCHE_STR_100.csv"
+covid_cases_file = sys.argv[2] if len(sys.argv) > 2 else "CovidFaelle_Altersgruppe.csv"
+repeats = 3
+
+###############################################################################
+# main
+###############################################################################
+
+# single years and means/medians of all ranges of 2 or more years
+baselines = list(range(2000, 2020)) + \
+            [Baseline(tuple(range(first, last+1)), statistic) for first, last in itertools.combinations(range(2000, 2020), 2)
+             for statistic in ["mean", "median"]]
+
+# excess mortality as before: rows of the baseline years filtered with isin, repeated with np.resize
+def excess_isin(data_mortalRate_df_filtered, baseline):
+    years = list(baseline.years) if isinstance(baseline, Baseline) else [baseline]
+    mortal = data_mortalRate_df_filtered.loc[data_mortalRate_df_filtered["Year"].isin(covidYears), "F-ANZ-1"].to_numpy()
+    baseline_df = data_mortalRate_df_filtered.loc[data_mortalRate_df_filtered["Year"].isin(years)]
+    weekly = baseline_df.groupby("KW")["F-ANZ-1"].agg("median" if isinstance(baseline, Baseline) and baseline.statistic == "median" else "mean")
+    return (mortal - np.resize(weekly.to_numpy(), len(mortal))).cumsum()
+
+def excess_store(data_mortalRate_df_filtered):
+    # store built once, all baselines on it
+    store = WeeklyDeaths.from_frame(data_mortalRate_df_filtered)
+    rows = data_mortalRate_df_filtered["Year"].isin(covidYears).to_numpy()
+    years, kws = data_mortalRate_df_filtered["Year"].to_numpy()[rows], data_mortalRate_df_filtered["KW"].to_numpy()[rows]
+    return [store.excess(baseline, years, kws).cumsum() for baseline in baselines]
+
+config = AnalysisConfig()
+data_mortalRate_df_filtered, _, _ = deduct_stage(load_inputs(mortality_rate_file, covid_cases_file, config=config), config)
+# same result where no 53 week year is involved
+for baseline, excessmortalCum in zip(baselines, excess_store(data_mortalRate_df_filtered)):
+    years = baseline.years if isinstance(baseline, Baseline) else [baseline]
+    if not any(year in [2004, 2009, 2015] for year in years):
+        assert np.allclose(excess_isin(data_mortalRate_df_filtered, baseline), excessmortalCum)
+
+t_isin = min(timeit.repeat(lambda: [excess_isin(data_mortalRate_df_filtered, baseline) for baseline in baselines], number=1, repeat=repeats))
+t_store = min(timeit.repeat(lambda: excess_store(data_mortalRate_df_filtered), number=1, repeat=repeats))
+print(f"{len(baselines)} baselines")
+print(f"isin filter per baseline: {t_isin*1000:8.1f} ms")
+print(f"WeeklyDeaths store:       {t_store*1000:8.1f} ms (x{t_isin/t_store:.1f})")
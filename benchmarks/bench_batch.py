@@ -0,0 +1,39 @@
+import os
+import sys
+import timeit
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from batch import config_grid, run_batch
+from engine import load_inputs, regionNames, sexNames
+
+###############################################################################
+# input
+###############################################################################
+
+mortality_rate_file = sys.argv[1] if len(sys.argv) > 1 else "OGD_rate_kalwo_GEST_KALWOCHE_STR_100.csv"
+covid_cases_file = sys.argv[2] if len(sys.argv) > 2 else "CovidFaelle_Altersgruppe.csv"
+maxProcesses = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+repeats = 3
+
+###############################################################################
+# main
+###############################################################################
+
+# 10 regions x 3 sexes = 30 strata, each against 20 x 5 pairs of baseline years: 3000 configurations
+configs = config_grid(regions=list(regionNames), sexes=list(sexNames),
+                      baselineYears=list(range(2000, 2020)), baselineYears_2=list(range(2015, 2020)))
+inputs = load_inputs(mortality_rate_file, covid_cases_file)
+
+# same table with any number of processes
+serial_df = run_batch(inputs, configs, processes=1)
+pd.testing.assert_frame_equal(serial_df, run_batch(inputs, configs, processes=max(2, maxProcesses)))
+
+print(f"{len(configs)} configurations, {len(serial_df)} rows, {os.cpu_count()} cores")
+t_serial = None
+for processes in range(1, max(2, maxProcesses) + 1):
+    t = min(timeit.repeat(lambda: run_batch(inputs, configs, processes=processes), number=1, repeat=repeats))
+    t_serial = t_serial or t
+    print(f"processes {processes:3d}: {t*1000:8.1f} ms, speedup x{t_serial/t:.2f} ({t_serial/t/processes*100:.0f}% of linear)"
+          + (" - more processes than cores" if processes > os.cpu_count() else ""))
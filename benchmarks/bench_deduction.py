@@ -0,0 +1,58 @@
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from analysis import decode_kalw, deduct_covid_deaths
+
+###############################################################################
+# input
+###############################################################################
+
+mortality_rate_file = sys.argv[1] if len(sys.argv) > 1 else "OGD_rate_kalwo_GEST_KALWOCHE_STR_100.csv"
+covid_cases_file = sys.argv[2] if len(sys.argv) > 2 else "CovidFaelle_Altersgruppe.csv"
+repeats = 5
+
+###############################################################################
+# main
+###############################################################################
+
+# per-week interpolation loop as used in main.py before deduct_covid_deaths
+def deduct_covid_deaths_loop(data_mortalRate_df_filtered, covidDeathsCum_df):
+    F_ANZ_cleanedByCovidDeaths = []
+    F_ANZ_cleanedByCovidDeaths.append(data_mortalRate_df_filtered["F-ANZ-1"].to_numpy(dtype=int)[0]) #add first value manually
+    for lb, ub, F_ANZ in zip(data_mortalRate_df_filtered["Time"].to_numpy()[0:-1], \
+                      data_mortalRate_df_filtered["Time"].to_numpy()[1::] , \
+                      data_mortalRate_df_filtered["F-ANZ-1"].to_numpy(dtype=int)[1::]):
+        value_lb = np.interp(float(lb), covidDeathsCum_df["Time"].to_numpy(dtype=float), covidDeathsCum_df["CovidDeathsCum"].to_numpy(), left=0)
+        value_ub = np.interp(float(ub), covidDeathsCum_df["Time"].to_numpy(dtype=float), covidDeathsCum_df["CovidDeathsCum"].to_numpy(), left=0)
+        delta = value_ub-value_lb
+        F_ANZ_cleanedByCovidDeaths.append(F_ANZ-delta)
+    return np.array(F_ANZ_cleanedByCovidDeaths, dtype=float)
+
+data_mortalRate_df = pd.read_csv(mortality_rate_file, sep=";", decimal=",")
+years, kws, times = decode_kalw(data_mortalRate_df["C-KALWOCHE-0"].to_numpy(dtype=str))
+data_mortalRate_df["Time"] = times
+data_mortalRate_df_filtered = data_mortalRate_df.loc[(data_mortalRate_df["C-BLWO-0"] == "BLWO-0") & \
+                                                     (data_mortalRate_df["C-SEXWO-0"] == "SEXWO-0")]
+data_covidCases_df = pd.read_csv(covid_cases_file, sep=";", decimal=",")
+data_covidCases_df["Time"] = pd.to_datetime(data_covidCases_df["Time"],dayfirst=True)
+covidDeathsCum_df = data_covidCases_df.loc[data_covidCases_df["Bundesland"]=="Österreich"] \
+    .groupby("Time", as_index=False)["AnzahlTot"].sum().rename(columns={"AnzahlTot": "CovidDeathsCum"})
+
+def deduct_covid_deaths_batched():
+    return deduct_covid_deaths(data_mortalRate_df_filtered["Time"], data_mortalRate_df_filtered["F-ANZ-1"],
+                               covidDeathsCum_df["Time"], covidDeathsCum_df["CovidDeathsCum"])
+
+# results have to be bit-identical
+assert np.array_equal(deduct_covid_deaths_loop(data_mortalRate_df_filtered, covidDeathsCum_df), deduct_covid_deaths_batched()), \
+    "deduct_covid_deaths differs from interpolation loop"
+
+t_loop = min(timeit.repeat(lambda: deduct_covid_deaths_loop(data_mortalRate_df_filtered, covidDeathsCum_df), number=1, repeat=repeats))
+t_batch = min(timeit.repeat(deduct_covid_deaths_batched, number=1, repeat=repeats))
+print(f"weeks: {len(data_mortalRate_df_filtered)}, covid days: {len(covidDeathsCum_df)}")
+print(f"interpolation loop:  {t_loop*1000:8.1f} ms")
+print(f"deduct_covid_deaths: {t_batch*1000:8.1f} ms (x{t_loop/t_batch:.1f})")
@@ -0,0 +1,49 @@
+import os
+import sys
+import subprocess
+
+###############################################################################
+# input
+###############################################################################
+
+module = "cli" # entry point of compute-only runs
+importBudgetMs = 1000 # regression budget for the cumulative import time of module
+forbidden = ["matplotlib"] # must not be imported without plotting
+repeats = 5
+
+###############################################################################
+# main
+###############################################################################
+
+# python -X importtime prints "import time: self [us] | cumulative [us] | package" per imported module
+def import_times():
+    repo = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=repo, capture_output=True, text=True, check=True).stderr
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name[1:].rstrip()] = int(cumulative_us) # nested imports are indented
+    return times
+
+runs = [import_times() for _ in range(repeats)]
+times = min(runs, key=lambda run: run[module])
+totalMs = times[module] / 1000
+
+print(f"import {module}: {totalMs:.0f} ms (budget {importBudgetMs} ms, best of {repeats})")
+packages = {}
+for name, us in times.items():
+    package = name.strip().split(".")[0]
+    if package != module:
+        packages[package] = max(packages.get(package, 0), us)
+for name, us in sorted(packages.items(), key=lambda item: -item[1])[0:10]:
+    print(f"  {name:30s} {us/1000:8.1f} ms")
+
+errors = [f"{name} is imported" for name in forbidden if any(imported.strip().split(".")[0] == name for imported in times)]
+if totalMs > importBudgetMs:
+    errors.append(f"import time {totalMs:.0f} ms exceeds budget of {importBudgetMs} ms")
+for error in errors:
+    print("FAILED:", error)
+sys.exit(1 if errors else 0)
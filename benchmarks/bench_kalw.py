@@ -0,0 +1,56 @@
+import os
+import sys
+import timeit
+import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from analysis import decode_kalw
+
+###############################################################################
+# input
+###############################################################################
+
+mortality_rate_file = sys.argv[1] if len(sys.argv) > 1 else "OGD_rate_kalwo_GEST_KALWOCHE_STR_100.csv"
+repeats = 5
+
+###############################################################################
+# main
+###############################################################################
+
+# per-row strptime loop as used in main.py before decode_kalw
+def decode_kalw_loop(codes):
+    years = []
+    kws = []
+    times = []
+    for date in codes:
+        _time = datetime.datetime.strptime(date+"1", "KALW-%Y%W%w")
+        _year = int(date[5:9])
+        _kw = int(date[9:11])
+        if (_year==2020 and _kw==53):
+            years.append(2021)
+            kws.append(1)
+            times.append(_time+datetime.timedelta(weeks=1))
+        elif (_year==2021):
+            years.append(_year)
+            kws.append(_kw+1)
+            times.append(_time+datetime.timedelta(weeks=2))
+        else:
+            years.append(_year)
+            kws.append(_kw)
+            times.append(_time+datetime.timedelta(weeks=1))
+    return np.array(years), np.array(kws), np.array(times, dtype="datetime64[ns]")
+
+codes = pd.read_csv(mortality_rate_file, sep=";", usecols=["C-KALWOCHE-0"])["C-KALWOCHE-0"].to_numpy(dtype=str)
+
+# results have to match exactly
+for expected, actual, name in zip(decode_kalw_loop(codes), decode_kalw(codes), ["Year", "KW", "Time"]):
+    assert np.array_equal(expected, actual), f"decode_kalw differs from strptime loop in column {name}"
+
+t_loop = min(timeit.repeat(lambda: decode_kalw_loop(codes), number=1, repeat=repeats))
+t_vect = min(timeit.repeat(lambda: decode_kalw(codes), number=1, repeat=repeats))
+print(f"rows: {len(codes)}, unique codes: {len(np.unique(codes))}")
+print(f"strptime loop: {t_loop*1000:8.1f} ms")
+print(f"decode_kalw:   {t_vect*1000:8.1f} ms (x{t_loop/t_vect:.1f})")
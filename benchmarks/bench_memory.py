@@ -0,0 +1,74 @@
+import os
+import sys
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+###############################################################################
+# input
+###############################################################################
+
+vacc_doses_file = sys.argv[1] if len(sys.argv) > 1 else "COVID19_vaccination_doses_timeline.csv"
+stateName = "Österreich"
+
+###############################################################################
+# main
+###############################################################################
+
+# each variant runs in its own process, peak RSS (ru_maxrss) is only growing within a process
+def load_all_columns(path):
+    # loading as done before: all columns with default dtypes, dates parsed per row
+    import pandas as pd
+    data_vaccDoses_df = pd.read_csv(path, sep=";")
+    data_vaccDoses_df["Time"] = pd.to_datetime(data_vaccDoses_df["date"].str[0:10], format="%Y-%m-%d")
+    return data_vaccDoses_df
+
+def parse_vacc_doses(path, filters=None):
+    # whole timeline as frame of the used columns, as loaded before the series were streamed
+    from loading import read_csv_lean, vaccDtypes, _category_times
+    data_vaccDoses_df = read_csv_lean(path, vaccDtypes, filters, sep=";")
+    data_vaccDoses_df["Time"] = _category_times(data_vaccDoses_df["date"], "%Y-%m-%d", 10)
+    return data_vaccDoses_df
+
+def load_lean(path):
+    return parse_vacc_doses(path)
+
+def load_lean_filtered(path):
+    return parse_vacc_doses(path, {"state_name": [stateName]})
+
+def load_streamed_series(path):
+    # cumulated doses per vaccine and dose of one state, the rows are not kept
+    import numpy as np
+    import pandas as pd
+    from loading import stream_vacc_doses_cum
+    vaccDosesCum, _, _ = stream_vacc_doses_cum(path, {"state_name": [stateName]})
+    # memory_usage of the series as frame, for the same output as the other variants
+    return pd.DataFrame({"times": np.concatenate([times for times, doses in vaccDosesCum.values()]),
+                         "doses": np.concatenate([doses for times, doses in vaccDosesCum.values()])})
+
+variants = {"all columns, object/int64": load_all_columns,
+            "used columns, categoricals": load_lean,
+            f"filtered to {stateName} while reading": load_lean_filtered,
+            f"streamed series of {stateName}": load_streamed_series}
+
+def _peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024*1024 if sys.platform == "darwin" else 1024)
+
+if len(sys.argv) > 2:
+    # child process: load with one variant and print rows, frame size and peak RSS
+    import pandas
+    import loading
+    before = _peak_rss_mb()
+    data_vaccDoses_df = variants[sys.argv[2]](vacc_doses_file)
+    frameSize = data_vaccDoses_df.memory_usage(deep=True).sum() / (1024*1024)
+    print(len(data_vaccDoses_df), frameSize, _peak_rss_mb() - before, _peak_rss_mb())
+    sys.exit(0)
+
+print(f"{vacc_doses_file}: {os.path.getsize(vacc_doses_file)/(1024*1024):.1f} MB")
+for name in variants:
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), vacc_doses_file, name],
+                            check=True, capture_output=True, text=True).stdout.split()
+    rows, frameSize, peakIncrease, peak = int(output[0]), *map(float, output[1:])
+    print(f"{name:40s} rows {rows:9d}, frame {frameSize:7.1f} MB, peak RSS +{peakIncrease:7.1f} MB (total {peak:7.1f} MB)")
@@ -0,0 +1,168 @@
+import os
+import sys
+import json
+import argparse
+import platform
+import tempfile
+import datetime
+import subprocess
+from importlib.metadata import version
+
+benchmarks = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(benchmarks, ".."))
+
+###############################################################################
+# input
+###############################################################################
+
+scales = [1, 10, 100]
+repeats = 3
+data_dir = os.path.join(benchmarks, "data") # synthetic files, written once per scale
+results_dir = os.path.join(benchmarks, "results") # one json file per run
+
+###############################################################################
+# runs
+###############################################################################
+
+def run_pipeline(directory):
+    """runs on the files in directory, their stages are timed by instrumentation (ANALYSIS_PROFILE).
+
+    "filtered": one analysis as main.py does it, rows of other strata are skipped while reading.
+    "unfiltered": all rows loaded, filtered, aggregated and analysed for the same stratum.
+    "batch": all states and sexes against 5 baseline years on the rows loaded in "unfiltered",
+    in this process, so the stages of all strata are measured (and summed up per stage).
+    """
+    from synthetic import mortality_rate_file, covid_cases_file, vacc_doses_file
+    from batch import config_grid, run_batch
+    from engine import AnalysisConfig, load_inputs, run_analysis, regionNames, sexNames
+    from instrumentation import stage
+    from plotting import figure_specs
+    files = [os.path.join(directory, name) for name in [mortality_rate_file, covid_cases_file, vacc_doses_file]]
+    config = AnalysisConfig()
+    with stage("filtered"):
+        inputs = load_inputs(*files, config)
+        figure_specs(inputs, run_analysis(inputs, config), config)
+    with stage("unfiltered"):
+        inputs = load_inputs(*files)
+        figure_specs(inputs, run_analysis(inputs, config), config)
+    with stage("batch") as s:
+        s.rows = len(run_batch(inputs, config_grid(regions=list(regionNames), sexes=list(sexNames),
+                                                   baselineYears=[2015, 2016, 2017, 2018, 2019]), processes=1))
+
+def write_data(directory, scale):
+    # in a new process as well, a child process starts with the peak RSS of its parent
+    output = subprocess.run([sys.executable, os.path.join(benchmarks, "synthetic.py"), directory, str(scale)],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+def time_stages(directory):
+    """stages of one run in a new process, with an empty cache so every file is parsed."""
+    with tempfile.TemporaryDirectory() as workDir:
+        report_file = os.path.join(workDir, "profile.json")
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--run", os.path.abspath(directory)],
+                       cwd=workDir, env=dict(os.environ, ANALYSIS_PROFILE=report_file), check=True)
+        with open(report_file) as f:
+            return json.load(f)
+
+def run_stages(report):
+    # stages of a report by run ("filtered", ...) and stage name, stages repeated within a run are summed up
+    runs = {}
+    pending = []
+    for record in report["stages"]:
+        # a stage is recorded when it ends, so the stages of a run come before the run itself
+        if record["parent"] is None:
+            stages = {}
+            for child in pending:
+                summed = stages.setdefault(child["stage"], {"parent": child["parent"], "wall_s": 0.0, "cpu_s": 0.0, "rows": None,
+                                                            "peak_rss_mb": None})
+                summed["wall_s"] += child["wall_s"]
+                summed["cpu_s"] += child["cpu_s"]
+                if child.get("peak_rss_mb") is not None: # peak while the stage ran, highest of repeated stages
+                    summed["peak_rss_mb"] = max(summed["peak_rss_mb"] or 0, child["peak_rss_mb"])
+                if child["rows"] is not None:
+                    summed["rows"] = (summed["rows"] or 0) + child["rows"]
+            runs[record["stage"]] = {"wall_s": record["wall_s"], "rows": record["rows"], "peak_rss_mb": record["peak_rss_mb"],
+                                     "stages": stages}
+            pending = []
+        else:
+            pending.append(record)
+    return runs
+
+def best_of(reports):
+    # fastest wall time of each run and stage over the repeats, in order of the first report
+    best = {}
+    for runs in map(run_stages, reports):
+        for runName, run in runs.items():
+            bestRun = best.setdefault(runName, dict(run, stages={}))
+            bestRun["wall_s"] = min(bestRun["wall_s"], run["wall_s"])
+            bestRun["peak_rss_mb"] = max(bestRun["peak_rss_mb"] or 0, run["peak_rss_mb"] or 0)
+            for name, record in run["stages"].items():
+                if name not in bestRun["stages"] or record["wall_s"] < bestRun["stages"][name]["wall_s"]:
+                    bestRun["stages"][name] = record
+    return {"peak_rss_mb": max(report["peak_rss_mb"] or 0 for report in reports), "runs": best}
+
+###############################################################################
+# results
+###############################################################################
+
+def _line(name, record, previous, indent):
+    line = f"{'  '*indent + name:44s} {record['wall_s']*1000:10.1f} ms  rows {record['rows'] if record['rows'] is not None else '':>9}"
+    line += f"  peak {record['peak_rss_mb']:6.0f} MB" if record.get("peak_rss_mb") is not None else " "*15
+    if previous is not None and previous["wall_s"] > 0:
+        line += f"  x{record['wall_s'] / previous['wall_s']:.2f} of {previous['wall_s']*1000:.1f} ms"
+    return line
+
+def print_results(results, compare=None):
+    for scale, result in results["scales"].items():
+        previousRuns = (compare or {}).get("scales", {}).get(scale, {}).get("runs", {})
+        print(f"scale {scale}x: {result['rows']}, peak RSS {result['peak_rss_mb']:.0f} MB")
+        for runName, run in result["runs"].items():
+            previousRun = previousRuns.get(runName)
+            print(_line(runName, run, previousRun, 1))
+            for name, record in run["stages"].items():
+                previous = previousRun["stages"].get(name) if previousRun is not None else None
+                print(_line(name, record, previous, 3 if record["parent"] != runName else 2))
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="time the pipeline stages on synthetic input files of growing scale")
+    parser.add_argument("--scales", type=int, nargs="+", default=scales, help="multiples of the size of the real files")
+    parser.add_argument("--repeats", type=int, default=repeats)
+    parser.add_argument("--data-dir", default=data_dir)
+    parser.add_argument("--output", help=f"result file, default {results_dir}/scaling_<time>.json")
+    parser.add_argument("--compare", help="result file of an earlier run to compare with")
+    parser.add_argument("--run", help=argparse.SUPPRESS) # internal: run the pipeline once on this directory
+    return parser.parse_args(argv)
+
+###############################################################################
+# main
+###############################################################################
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.run:
+        run_pipeline(args.run)
+        return 0
+
+    now = datetime.datetime.now()
+    results = {"time": now.isoformat(timespec="seconds"), "machine": platform.platform(), "processor": platform.processor(),
+               "python": platform.python_version(), "numpy": version("numpy"), "pandas": version("pandas"),
+               "repeats": args.repeats, "scales": {}}
+    for scale in args.scales:
+        directory = os.path.join(args.data_dir, f"scale_{scale}")
+        rows = write_data(directory, scale)
+        results["scales"][str(scale)] = dict(rows=rows, **best_of([time_stages(directory) for _ in range(args.repeats)]))
+
+    output = args.output or os.path.join(results_dir, f"scaling_{now:%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=1)
+    compare = None
+    if args.compare:
+        with open(args.compare) as f:
+            compare = json.load(f)
+    print_results(results, compare)
+    print(f"results written to {output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
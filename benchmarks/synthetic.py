@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+import datetime
+
+import numpy as np
+import pandas as pd
+
+###############################################################################
+# input
+###############################################################################
+
+# file names as downloaded, so scripts and cli.py defaults work in a directory of synthetic files
+mortality_rate_file = "OGD_rate_kalwo_GEST_KALWOCHE_STR_100.csv"
+covid_cases_file = "CovidFaelle_Altersgruppe.csv"
+vacc_doses_file = "COVID19_vaccination_doses_timeline.csv"
+
+# scale 1 has the size of the real files, larger scales add districts (regions of the mortality data), age groups
+# (covid data) and vaccines (vaccination data), the age groups and vaccines are kept by the analysis of a state
+mortalityYears = range(2000, 2022)
+mortalityLastKW2021 = 51
+covidDays = pd.date_range("2020-02-26", "2021-12-26", freq="D")
+vaccDays = pd.date_range("2020-12-27", "2022-01-19", freq="D")
+states = ["Burgenland", "Kärnten", "Niederösterreich", "Oberösterreich", "Salzburg", "Steiermark", "Tirol", "Vorarlberg", "Wien"]
+ageGroups = ["<5", "5-14", "15-24", "25-34", "35-44", "45-54", "55-64", "65-74", "75-84", ">84"]
+vaccines = ["AstraZeneca", "BioNTechPfizer", "Janssen", "Moderna", "Other"]
+generatorVersion = 3 # increase when the generated files change, files are written again
+blockRows = 1<<20 # rows per write, the random numbers are drawn at once but the text columns per block
+
+###############################################################################
+# files
+###############################################################################
+
+def _write_blocks(path, frame_of, steps, rowsPerStep, **to_csv):
+    # writes frame_of(first, last) for blocks of steps (days or weeks), so the text columns of large scales fit in memory
+    stepsPerBlock = max(1, blockRows // rowsPerStep)
+    for first in range(0, steps, stepsPerBlock):
+        frame_of(first, min(first + stepsPerBlock, steps)).to_csv(path, mode="w" if first == 0 else "a", header=first == 0,
+                                                                   index=False, **to_csv)
+        if first == 0 and to_csv.get("encoding") == "utf-8-sig":
+            to_csv["encoding"] = "utf-8" # BOM only at the start of the file
+    return steps * rowsPerStep
+
+def _kalw_codes():
+    # KALW-YYYYWW codes of all weeks, 53 weeks in years with 53 ISO weeks as in the real file
+    codes = []
+    for year in mortalityYears:
+        weeks = datetime.date(year, 12, 28).isocalendar()[1] if year < 2021 else mortalityLastKW2021
+        codes += [f"KALW-{year}{week:02d}" for week in range(1, weeks+1)]
+    return np.array(codes)
+
+def write_mortality_rate(path, scale, rng):
+    """weekly deaths by region and sex: C-KALWOCHE-0;C-BLWO-0;C-SEXWO-0;F-ANZ-1;F-RATE-1."""
+    codes = _kalw_codes()
+    regions = [f"BLWO-{region}" for region in range(10*scale)]
+    sexes = ["SEXWO-0", "SEXWO-1", "SEXWO-2"]
+    weekOfYear = np.array([int(code[9:11]) for code in codes])
+    seasonal = 1 + 0.15*np.cos(2*np.pi*(weekOfYear - 3)/52) # more deaths in winter
+    deaths = rng.poisson(np.multiply.outer(seasonal, np.full(len(regions)*len(sexes), 1800.0/scale)))
+    rates = rng.uniform(0.15, 0.45, deaths.shape).round(3)
+    # rows ordered by week, region, sex like the real file
+    frame_of = lambda first, last: pd.DataFrame({"C-KALWOCHE-0": np.repeat(codes[first:last], len(regions)*len(sexes)),
+                                                 "C-BLWO-0": np.tile(np.repeat(regions, len(sexes)), last-first),
+                                                 "C-SEXWO-0": np.tile(sexes, (last-first)*len(regions)),
+                                                 "F-ANZ-1": deaths[first:last].ravel().astype(float),
+                                                 "F-RATE-1": rates[first:last].ravel()})
+    return _write_blocks(path, frame_of, len(codes), len(regions)*len(sexes), sep=";", decimal=",", float_format="%.3f")
+
+def write_covid_cases(path, scale, rng):
+    """cumulated covid cases by day, state, age group and sex in the CovidFaelle_Altersgruppe layout."""
+    bundeslaender = states + ["Österreich"]
+    ageGroupNames = ageGroups if scale == 1 else [f"G{ageGroupId}" for ageGroupId in range(1, 10*scale+1)]
+    groups = len(bundeslaender) * len(ageGroupNames) * 2
+    deathRates = np.repeat(np.linspace(0.01, 0.5, len(ageGroupNames)) / scale, 2)
+    deathRates = np.concatenate([np.tile(deathRates, len(states)), deathRates*10]) # Österreich: all states
+    anzahlTot = rng.poisson(np.tile(deathRates, (len(covidDays), 1))).cumsum(axis=0)
+    anzahl = anzahlTot * 50 + rng.poisson(5, anzahlTot.shape).cumsum(axis=0)
+    times = covidDays.strftime("%d.%m.%Y 00:00:00")
+    # rows ordered by day, state, age group, sex like the real file
+    frame_of = lambda first, last: pd.DataFrame({"Time": np.repeat(times[first:last], groups),
+                                                 "Altersgruppe": np.tile(np.repeat(ageGroupNames, 2), (last-first)*len(bundeslaender)),
+                                                 "Bundesland": np.tile(np.repeat(bundeslaender, len(ageGroupNames)*2), last-first),
+                                                 "BundeslandID": np.tile(np.repeat(np.arange(1, len(bundeslaender)+1), len(ageGroupNames)*2), last-first),
+                                                 "AnzEinwohner": 100000,
+                                                 "Geschlecht": np.tile(["M", "W"], (last-first)*len(bundeslaender)*len(ageGroupNames)),
+                                                 "Anzahl": anzahl[first:last].ravel(),
+                                                 "AnzahlGeheilt": (anzahl[first:last].ravel() * 0.9).astype(int),
+                                                 "AnzahlTot": anzahlTot[first:last].ravel(),
+                                                 "AltersgruppeID": np.tile(np.repeat(np.arange(1, len(ageGroupNames)+1), 2), (last-first)*len(bundeslaender))})
+    return _write_blocks(path, frame_of, len(covidDays), groups, sep=";")
+
+def write_vacc_doses(path, scale, rng):
+    """cumulated vaccine doses by day, state, vaccine and dose in the vaccination timeline layout (utf-8 with BOM)."""
+    stateNames = ["NoState"] + states + ["Österreich"]
+    vaccineNames = vaccines + [f"Vaccine {vaccine}" for vaccine in range(1, len(vaccines)*(scale-1)+1)]
+    series = len(stateNames) * len(vaccineNames) * 3
+    dates = (vaccDays + pd.Timedelta(hours=23, minutes=59, seconds=59)).tz_localize("Europe/Vienna").strftime("%Y-%m-%dT%H:%M:%S%z")
+    dates = dates.str[0:22] + ":" + dates.str[22:24] # +0100 -> +01:00
+    doses = rng.poisson(1000, (len(vaccDays), series)).cumsum(axis=0)
+    frame_of = lambda first, last: pd.DataFrame({"date": np.repeat(dates[first:last], series),
+                                                 "state_id": np.tile(np.repeat(np.arange(len(stateNames)), len(vaccineNames)*3), last-first),
+                                                 "state_name": np.tile(np.repeat(stateNames, len(vaccineNames)*3), last-first),
+                                                 "vaccine": np.tile(np.repeat(vaccineNames, 3), (last-first)*len(stateNames)),
+                                                 "dose_number": np.tile([1, 2, 3], (last-first)*len(stateNames)*len(vaccineNames)),
+                                                 "doses_administered_cumulative": doses[first:last].ravel()})
+    return _write_blocks(path, frame_of, len(vaccDays), series, sep=";", encoding="utf-8-sig")
+
+def write_synthetic(directory, scale, seed=0):
+    """write all input files of the given scale to directory, unless they are already there.
+
+    Returns the number of rows by file name.
+    """
+    meta_file = os.path.join(directory, "synthetic.json")
+    key = {"version": generatorVersion, "scale": scale, "seed": seed}
+    try:
+        with open(meta_file) as f:
+            meta = json.load(f)
+        if meta["key"] == key:
+            return meta["rows"]
+    except (OSError, ValueError, KeyError):
+        pass
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    rows = {name: write(os.path.join(directory, name), scale, rng)
+            for name, write in [(mortality_rate_file, write_mortality_rate),
+                                (covid_cases_file, write_covid_cases),
+                                (vacc_doses_file, write_vacc_doses)]}
+    with open(meta_file, "w") as f:
+        json.dump({"key": key, "rows": rows}, f)
+    return rows
+
+###############################################################################
+# main
+###############################################################################
+
+if __name__ == "__main__":
+    # python benchmarks/synthetic.py DIRECTORY [SCALE]
+    print(json.dumps(write_synthetic(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 1)))
@@ -0,0 +1,83 @@
+import sys
+import argparse
+
+# only numbers by default: matplotlib is imported on demand for --plot / --figure-dir
+from engine import AnalysisConfig, load_inputs, run_analysis, run_incremental, regionNames, sexNames
+from baselines import parse_baseline
+import instrumentation
+
+###############################################################################
+# input
+###############################################################################
+
+mortality_rate_file = "OGD_rate_kalwo_GEST_KALWOCHE_STR_100.csv"
+covid_cases_file = "CovidFaelle_Altersgruppe.csv"
+vacc_doses_file = "COVID19_vaccination_doses_timeline.csv"
+
+###############################################################################
+# main
+###############################################################################
+
+def excess_per_year(data_mortalRate_df_filtered_years):
+    """excess mortality per year (and last week) out of the cumulated excess mortality."""
+    lastWeek = data_mortalRate_df_filtered_years.groupby("Year")[["KW", "excessmortalCum"]].last()
+    lastWeek["excessmortal"] = lastWeek["excessmortalCum"].diff().fillna(lastWeek["excessmortalCum"])
+    return lastWeek[["KW", "excessmortal"]]
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="excess mortality, covid deaths and vaccination progress in Austria")
+    parser.add_argument("--mortality-file", default=mortality_rate_file)
+    parser.add_argument("--covid-file", default=covid_cases_file)
+    parser.add_argument("--vacc-file", default=vacc_doses_file, help="only needed for figures")
+    parser.add_argument("--region", default="BLWO-0", choices=list(regionNames), help="C-BLWO-0 code, default BLWO-0 (Austria)")
+    parser.add_argument("--sex", default="SEXWO-0", choices=list(sexNames), help="C-SEXWO-0 code, default SEXWO-0 (both)")
+    parser.add_argument("--age-bands", nargs="+", help="C-ALTER5-0 codes to sum up (5 year age band file)")
+    parser.add_argument("--covid-age-groups", nargs="+", type=int, help="AltersgruppeID of covid deaths to count")
+    parser.add_argument("--baseline", type=parse_baseline, default=2019,
+                        help="baseline of excess mortality: year, FIRST-LAST or comma separated years (mean), "
+                             "rFIRST-LAST for years before each year, prefix median: for the median")
+    parser.add_argument("--baseline-2", type=parse_baseline, default=2020, help="baseline of excess mortality with deduced covid deaths")
+    parser.add_argument("--incremental", action="store_true", help="only process rows appended since the last run")
+    parser.add_argument("--plot", action="store_true", help="show figures")
+    parser.add_argument("--figure-dir", help="write figures to this directory")
+    parser.add_argument("--profile", metavar="FILE", help=f"write timing and memory of each stage as json report (or set {instrumentation.profileEnv})")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.profile:
+        instrumentation.enable(args.profile)
+    config = AnalysisConfig(region=args.region, sex=args.sex,
+                            ageBands=tuple(args.age_bands) if args.age_bands else None,
+                            covidAgeGroupIds=tuple(args.covid_age_groups) if args.covid_age_groups else None,
+                            mortalityBaselineYear=args.baseline, mortalityBaselineYear_2=args.baseline_2)
+    plotting = args.plot or args.figure_dir
+    vaccFile = args.vacc_file if plotting else None
+    if args.incremental:
+        inputs, result = run_incremental(args.mortality_file, args.covid_file, vaccFile, config)
+    else:
+        inputs = load_inputs(args.mortality_file, args.covid_file, vaccFile, config)
+        result = run_analysis(inputs, config)
+
+    covidDeathsCum_df = result["covidDeathsCum_df"]
+    print(f"covid deaths until {covidDeathsCum_df['Time'].max():%Y-%m-%d}: {covidDeathsCum_df['CovidDeathsCum'].iloc[-1]}")
+    print(f"excess mortality, baseline {config.mortalityBaselineYear}:")
+    for year, row in excess_per_year(result["data_mortalRate_df_filtered_CovidYears"]).iterrows():
+        print(f"  {year} (until KW {row['KW']:.0f}): {row['excessmortal']:.0f}")
+    print(f"excess mortality, covid deaths deducted, baseline {config.mortalityBaselineYear_2}:")
+    for year, row in excess_per_year(result["data_mortalRate_df_filtered_vaccYear"]).iterrows():
+        print(f"  {year} (until KW {row['KW']:.0f}): {row['excessmortal']:.0f}")
+
+    if plotting:
+        from plotting import figure_specs, show_figures, render_figures
+        figures = figure_specs(inputs, result, config)
+        if args.figure_dir:
+            render_figures(figures, args.figure_dir)
+        if args.plot:
+            from matplotlib import pyplot
+            show_figures(figures)
+            pyplot.show()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
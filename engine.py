@@ -0,0 +1,198 @@
+import os
+import hashlib
+from dataclasses import dataclass
+
+from analysis import aggregate_weekly, covid_deaths_cum, covid_deaths_by_age, add_covid_deduced, excess_frames
+from loading import cache_dir, load_mortality_rate, load_covid_cases, stream_vacc_doses_cum
+from incremental import update_analysis, update_vacc_doses_cum
+from instrumentation import stage
+
+# region codes of the mortality data (C-BLWO-0) and matching names of the covid data (Bundesland)
+regionNames = {"BLWO-0": "Österreich",
+               "BLWO-1": "Burgenland",
+               "BLWO-2": "Kärnten",
+               "BLWO-3": "Niederösterreich",
+               "BLWO-4": "Oberösterreich",
+               "BLWO-5": "Salzburg",
+               "BLWO-6": "Steiermark",
+               "BLWO-7": "Tirol",
+               "BLWO-8": "Vorarlberg",
+               "BLWO-9": "Wien"}
+# sex codes of the mortality data (C-SEXWO-0) and matching values of the covid data (Geschlecht)
+sexNames = {"SEXWO-0": None, "SEXWO-1": "M", "SEXWO-2": "W"}
+# age groups of the covid data (AltersgruppeID) and the 5 year age bands of the mortality data (C-ALTER5-0) they cover
+covidAgeBands = {1: ("ALTER5-1",), # <5
+                 2: ("ALTER5-2", "ALTER5-3"), # 5-14
+                 3: ("ALTER5-4", "ALTER5-5"), # 15-24
+                 4: ("ALTER5-6", "ALTER5-7"), # 25-34
+                 5: ("ALTER5-8", "ALTER5-9"), # 35-44
+                 6: ("ALTER5-10", "ALTER5-11"), # 45-54
+                 7: ("ALTER5-12", "ALTER5-13"), # 55-64
+                 8: ("ALTER5-14", "ALTER5-15"), # 65-74
+                 9: ("ALTER5-16", "ALTER5-17"), # 75-84
+                 10: ("ALTER5-18", "ALTER5-19", "ALTER5-20", "ALTER5-21")} # >84
+
+###############################################################################
+# configuration and inputs
+###############################################################################
+
+@dataclass(frozen=True)
+class AnalysisConfig:
+    """what to analyse: stratum of the mortality and covid data and baseline years."""
+    region: str = "BLWO-0" # C-BLWO-0 code, BLWO-0 is Austria
+    sex: str = "SEXWO-0" # C-SEXWO-0 code, SEXWO-0 is both sexes
+    ageBands: tuple = None # C-ALTER5-0 codes to sum up, None for all rows (file without age bands)
+    covidAgeGroupIds: tuple = None # AltersgruppeID of covid data to count, None for all age groups
+    # baseline years (or baselines.Baseline, e.g. mean of several years)
+    mortalityBaselineYear: int = 2019 # for analysis of covid deaths vs. excess mortality of covid years
+    mortalityBaselineYear_2: int = 2020 # for analysis of excess mortality (with already deduced covid deaths) vs. vaccination progress
+
+@dataclass
+class InputData:
+    """parsed input files, shared by all analyses and never modified by them."""
+    data_mortalRate_df: object
+    data_covidCases_df: object
+    vaccDosesCum: dict = None # cumulated vaccine doses by (state_name, vaccine, dose_number), see loading.read_vacc_doses_cum
+
+def read_filters(config):
+    """column filters of the configured stratum for the mortality, covid and vaccination files.
+
+    Used to skip rows of other strata while reading. Filters of columns a file does not
+    have are ignored there, filter_mortality still checks them.
+    """
+    if config is None:
+        return None, None, None
+    mortalityFilters = {"C-BLWO-0": [config.region], "C-SEXWO-0": [config.sex]}
+    if config.ageBands is not None:
+        mortalityFilters["C-ALTER5-0"] = list(config.ageBands)
+    covidFilters = {"Bundesland": [regionNames[config.region]]}
+    if sexNames[config.sex] is not None:
+        covidFilters["Geschlecht"] = [sexNames[config.sex]]
+    if config.covidAgeGroupIds is not None:
+        covidFilters["AltersgruppeID"] = list(config.covidAgeGroupIds)
+    return mortalityFilters, covidFilters, {"state_name": [regionNames[config.region]]}
+
+def load_inputs(mortality_rate_file, covid_cases_file, vacc_doses_file=None, config=None):
+    """stage 1: load (cached) input files, parsed and with converted times in column "Time".
+
+    With config only the rows of its stratum are loaded (see read_filters), otherwise
+    all rows, e.g. for batch runs over all strata.
+    """
+    mortalityFilters, covidFilters, vaccFilters = read_filters(config)
+    with stage("load mortality") as s:
+        data_mortalRate_df = load_mortality_rate(mortality_rate_file, filters=mortalityFilters)
+        s.rows = len(data_mortalRate_df)
+    with stage("load covid cases") as s:
+        data_covidCases_df = load_covid_cases(covid_cases_file, filters=covidFilters)
+        s.rows = len(data_covidCases_df)
+    vaccDosesCum = None
+    if vacc_doses_file:
+        vaccDosesCum, _, _ = stream_vacc_doses_cum(vacc_doses_file, vaccFilters)
+    return InputData(data_mortalRate_df, data_covidCases_df, vaccDosesCum)
+
+###############################################################################
+# stages
+###############################################################################
+
+def filter_mortality(data_mortalRate_df, config):
+    """stage 2: rows of the mortality data in the configured stratum.
+
+    Region and sex are only filtered if the file has the columns C-BLWO-0 / C-SEXWO-0,
+    age bands only if it has C-ALTER5-0, files without them can only be used for totals.
+    """
+    mask = True
+    for column, codes, total in [("C-BLWO-0", [config.region], "BLWO-0"),
+                                 ("C-SEXWO-0", [config.sex], "SEXWO-0"),
+                                 ("C-ALTER5-0", config.ageBands, None)]:
+        if codes is None:
+            continue
+        if column in data_mortalRate_df.columns:
+            mask = mask & data_mortalRate_df[column].isin(list(codes))
+        elif codes != [total]:
+            raise ValueError(f"mortality data has no column {column} to filter {codes}")
+    return data_mortalRate_df.loc[mask] if mask is not True else data_mortalRate_df
+
+def filter_covid(data_covidCases_df, config):
+    """stage 2: rows of the covid data in the configured stratum."""
+    mask = data_covidCases_df["Bundesland"] == regionNames[config.region]
+    if sexNames[config.sex] is not None:
+        mask = mask & (data_covidCases_df["Geschlecht"] == sexNames[config.sex])
+    if config.covidAgeGroupIds is not None:
+        mask = mask & data_covidCases_df["AltersgruppeID"].isin(list(config.covidAgeGroupIds))
+    return data_covidCases_df.loc[mask]
+
+def aggregate_mortality(data_mortalRate_df, config):
+    """stage 2+3: weekly deaths of the configured stratum."""
+    return aggregate_weekly(filter_mortality(data_mortalRate_df, config))
+
+def deduct_stage(inputs, config):
+    """stages 2-4: weekly deaths of the stratum with deduced covid deaths.
+
+    Returns (weekly deaths, cumulated covid deaths, covid data rows of the stratum).
+    Does not depend on the baseline years.
+    """
+    with stage("filter mortality") as s:
+        data_mortalRate_df_filtered = filter_mortality(inputs.data_mortalRate_df, config)
+        s.rows = len(data_mortalRate_df_filtered)
+    with stage("aggregate weekly deaths") as s:
+        data_mortalRate_df_filtered = aggregate_weekly(data_mortalRate_df_filtered)
+        s.rows = len(data_mortalRate_df_filtered)
+    with stage("filter covid cases") as s:
+        data_covidCases_df_filtered = filter_covid(inputs.data_covidCases_df, config)
+        s.rows = len(data_covidCases_df_filtered)
+    with stage("cumulate covid deaths") as s:
+        covidDeathsCum_df = covid_deaths_cum(data_covidCases_df_filtered)
+        s.rows = len(covidDeathsCum_df)
+    with stage("deduct covid deaths") as s:
+        data_mortalRate_df_filtered = add_covid_deduced(data_mortalRate_df_filtered, covidDeathsCum_df)
+        s.rows = len(data_mortalRate_df_filtered)
+    return data_mortalRate_df_filtered, covidDeathsCum_df, data_covidCases_df_filtered
+
+def excess_stage(data_mortalRate_df_filtered, config):
+    """stage 5: cumulated excess mortality of the covid years and of the vaccination year."""
+    with stage("excess mortality") as s:
+        data_mortalRate_df_filtered_CovidYears, data_mortalRate_df_filtered_vaccYear, _ = \
+            excess_frames(data_mortalRate_df_filtered, config.mortalityBaselineYear, config.mortalityBaselineYear_2)
+        s.rows = len(data_mortalRate_df_filtered_CovidYears) + len(data_mortalRate_df_filtered_vaccYear)
+    return data_mortalRate_df_filtered_CovidYears, data_mortalRate_df_filtered_vaccYear
+
+def run_analysis(inputs, config):
+    """run all stages for one configuration on already loaded inputs.
+
+    Returns the resulting frames by name: weekly deaths with deduced covid deaths,
+    cumulated covid deaths (total and by age) and cumulated excess mortality of the
+    covid years and of the vaccination year.
+    """
+    data_mortalRate_df_filtered, covidDeathsCum_df, data_covidCases_df_filtered = deduct_stage(inputs, config)
+    data_mortalRate_df_filtered_CovidYears, data_mortalRate_df_filtered_vaccYear = excess_stage(data_mortalRate_df_filtered, config)
+    with stage("covid deaths by age") as s:
+        covidDeathsByAgeCum_df = covid_deaths_by_age(data_covidCases_df_filtered)
+        s.rows = len(covidDeathsByAgeCum_df)
+    return {"data_mortalRate_df_filtered": data_mortalRate_df_filtered,
+            "covidDeathsCum_df": covidDeathsCum_df,
+            "covidDeathsByAgeCum_df": covidDeathsByAgeCum_df,
+            "data_mortalRate_df_filtered_CovidYears": data_mortalRate_df_filtered_CovidYears,
+            "data_mortalRate_df_filtered_vaccYear": data_mortalRate_df_filtered_vaccYear}
+
+def run_incremental(mortality_rate_file, covid_cases_file, vacc_doses_file, config, state_dir=cache_dir):
+    """like load_inputs and run_analysis, only processing rows appended since the last call.
+
+    State is kept per input files and configuration in state_dir, see incremental.py.
+    Input files read in full use the feather cache in state_dir as load_inputs does.
+    """
+    key = hashlib.sha256(repr((os.path.abspath(mortality_rate_file), os.path.abspath(covid_cases_file), config)).encode()).hexdigest()[0:16]
+    mortalityFilters, covidFilters, vaccFilters = read_filters(config)
+    data_mortalRate_df, data_covidCases_df, result = update_analysis(mortality_rate_file, covid_cases_file,
+                                                                     lambda df: aggregate_mortality(df, config),
+                                                                     lambda df: filter_covid(df, config),
+                                                                     config.mortalityBaselineYear, config.mortalityBaselineYear_2,
+                                                                     os.path.join(state_dir, f"incremental_{key}.pkl"),
+                                                                     mortalityFilters, covidFilters, state_dir)
+    vaccDosesCum = None
+    if vacc_doses_file:
+        vaccDosesCum = update_vacc_doses_cum(vacc_doses_file, vaccFilters,
+                                             os.path.join(state_dir, f"incremental_{os.path.basename(vacc_doses_file)}_{config.region}.pkl"))
+    with stage("covid deaths by age") as s:
+        result = dict(result, covidDeathsByAgeCum_df=covid_deaths_by_age(filter_covid(data_covidCases_df, config)))
+        s.rows = len(result["covidDeathsByAgeCum_df"])
+    return InputData(data_mortalRate_df, data_covidCases_df, vaccDosesCum), result
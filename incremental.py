@@ -0,0 +1,196 @@
+import io
+import os
+import pickle
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from analysis import covid_deaths_cum, deduct_covid_deaths, add_covid_deduced, excess_frames
+from loading import cache_dir, parse_mortality_rate, parse_covid_cases, concat_frames, load_cached, read_vacc_doses_cum, \
+    stream_vacc_doses_cum, concat_doses_cum
+from instrumentation import stage
+
+state_version = 3 # increase when derived series change, forces a full recompute
+
+###############################################################################
+# appended input files
+###############################################################################
+
+def _appended_bytes(f, source):
+    # bytes appended to f since source was read and sha256 of all bytes, (None, None) if read bytes changed
+    sha = hashlib.sha256()
+    prefix = f.read(source["offset"])
+    sha.update(prefix)
+    if len(prefix) != source["offset"] or sha.hexdigest() != source["sha256"]:
+        return None, None
+    appended = f.read()
+    sha.update(appended)
+    return appended, sha
+
+def read_appended(path, parse, source=None, filters=None, cache_dir=cache_dir):
+    """parse path, only parsing the appended rows if possible.
+
+    source is the state returned by a previous call. If the file only grew since then
+    (the previously read bytes are unchanged), just the appended bytes are parsed and
+    added to the previous frame. Otherwise the whole file is loaded with loading.load_cached
+    (feather cache in cache_dir). Returns (df, tail, source), tail is None if the whole
+    file was loaded. filters are passed to parse, see loading.read_csv_lean.
+    """
+    with open(path, "rb") as f:
+        if source is not None and source["parse"] == parse.__name__ and source.get("filters") == filters:
+            appended, sha = _appended_bytes(f, source)
+            if appended is not None:
+                previous = source["df"]
+                if appended.strip():
+                    tail = parse(io.BytesIO(appended), filters, header=None, names=source["columns"])
+                    tail = tail.astype({column: dtype for column, dtype in previous.dtypes.items()
+                                        if not isinstance(dtype, pd.CategoricalDtype)})
+                else:
+                    tail = previous.iloc[0:0]
+                tail.index = pd.RangeIndex(len(previous), len(previous)+len(tail))
+                df = concat_frames([previous, tail])
+                return df, tail, dict(source, offset=source["offset"]+len(appended), sha256=sha.hexdigest(), df=df)
+        # revised or unknown file, load everything
+        f.seek(0)
+        sha = hashlib.sha256()
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+        offset = f.tell()
+    df = load_cached(path, parse, cache_dir, filters)
+    columns = list(pd.read_csv(path, sep=";", nrows=0).columns)
+    return df, None, {"parse": parse.__name__, "filters": filters, "offset": offset, "sha256": sha.hexdigest(),
+                      "columns": columns, "df": df}
+
+def _load_state(state_file):
+    try:
+        with open(state_file, "rb") as f:
+            state = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return {}
+    return state if state.get("version") == state_version else {}
+
+def _save_state(state_file, state):
+    os.makedirs(os.path.dirname(state_file) or ".", exist_ok=True)
+    tmp_file = f"{state_file}.{os.getpid()}.tmp" # per process, runs on the same state may overlap
+    with open(tmp_file, "wb") as f:
+        pickle.dump(dict(state, version=state_version), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, state_file)
+
+def update_vacc_doses_cum(path, filters, state_file):
+    """loading.stream_vacc_doses_cum of path, only reading rows appended since the last call.
+
+    The series are persisted in state_file, appended rows are added to them. If earlier
+    rows of the file were revised, the whole file is streamed again.
+    """
+    source = _load_state(state_file).get("source")
+    vaccDosesCum = None
+    if source is not None and source.get("filters") == filters:
+        with open(path, "rb") as f:
+            appended, sha = _appended_bytes(f, source)
+        if appended is not None:
+            vaccDosesCum = source["vaccDosesCum"]
+            if appended.strip():
+                with stage("read appended vaccination doses"):
+                    vaccDosesCum = concat_doses_cum([vaccDosesCum, read_vacc_doses_cum(io.BytesIO(appended), filters,
+                                                                                         header=None, names=source["columns"])])
+            source = dict(source, offset=source["offset"]+len(appended), sha256=sha.hexdigest(), vaccDosesCum=vaccDosesCum)
+    if vaccDosesCum is None:
+        vaccDosesCum, offset, sha256 = stream_vacc_doses_cum(path, filters)
+        source = {"filters": filters, "offset": offset, "sha256": sha256,
+                  "columns": list(pd.read_csv(path, sep=";", nrows=0).columns), "vaccDosesCum": vaccDosesCum}
+    _save_state(state_file, {"source": source})
+    return vaccDosesCum
+
+###############################################################################
+# derived series
+###############################################################################
+
+def _compute_derived(data_mortalRate_df_filtered, covidDeathsCum_df, mortalityBaselineYear, mortalityBaselineYear_2):
+    data_mortalRate_df_filtered = add_covid_deduced(data_mortalRate_df_filtered, covidDeathsCum_df)
+    covidYears_df, vaccYear_df, excess = excess_frames(data_mortalRate_df_filtered, mortalityBaselineYear, mortalityBaselineYear_2)
+    derived = {"data_mortalRate_df_filtered": data_mortalRate_df_filtered,
+               "covidDeathsCum_df": covidDeathsCum_df,
+               "data_mortalRate_df_filtered_CovidYears": covidYears_df,
+               "data_mortalRate_df_filtered_vaccYear": vaccYear_df}
+    return derived, excess
+
+def _extend_derived(derived, excess, newWeeks_df, newCovidDeathsCum_df, mortalityBaselineYear, mortalityBaselineYear_2):
+    # returns None if new rows are not strictly later than the existing ones
+    filtered_df = derived["data_mortalRate_df_filtered"]
+    covidDeathsCum_df = derived["covidDeathsCum_df"]
+    if len(newWeeks_df) and len(filtered_df) and newWeeks_df["Time"].min() <= filtered_df["Time"].max():
+        return None
+    if len(newCovidDeathsCum_df) and len(covidDeathsCum_df) and newCovidDeathsCum_df["Time"].min() <= covidDeathsCum_df["Time"].max():
+        return None
+    oldWeeks = len(filtered_df)
+    covidTimeLast = covidDeathsCum_df["Time"].max() if len(covidDeathsCum_df) else None
+    if len(newCovidDeathsCum_df):
+        covidDeathsCum_df = pd.concat([covidDeathsCum_df, newCovidDeathsCum_df], ignore_index=True)
+    if len(newWeeks_df):
+        filtered_df = pd.concat([filtered_df, newWeeks_df], ignore_index=True)
+    else:
+        filtered_df = filtered_df.copy()
+
+    # weeks after the last interpolation boundary are deduced again, earlier weeks do not change
+    times = filtered_df["Time"].to_numpy()
+    start = oldWeeks
+    if len(newCovidDeathsCum_df):
+        start = 0 if covidTimeLast is None else min(start, np.searchsorted(times, np.datetime64(covidTimeLast), side="right"))
+    cleaned = filtered_df["F_ANZ_cleanedByCovidDeaths"].to_numpy(dtype=float, na_value=np.nan)
+    first = max(start-1, 0)
+    cleaned[start:] = deduct_covid_deaths(times[first:], filtered_df["F-ANZ-1"].to_numpy()[first:],
+                                          covidDeathsCum_df["Time"], covidDeathsCum_df["CovidDeathsCum"])[start-first:]
+    filtered_df["F_ANZ_cleanedByCovidDeaths"] = cleaned
+
+    covidYears_df, vaccYear_df, excess = excess_frames(filtered_df, mortalityBaselineYear, mortalityBaselineYear_2, excess)
+    derived = {"data_mortalRate_df_filtered": filtered_df,
+               "covidDeathsCum_df": covidDeathsCum_df,
+               "data_mortalRate_df_filtered_CovidYears": covidYears_df,
+               "data_mortalRate_df_filtered_vaccYear": vaccYear_df}
+    return derived, excess
+
+def update_analysis(mortality_rate_file, covid_cases_file, filter_mortality, filter_covid,
+                    mortalityBaselineYear, mortalityBaselineYear_2, state_file, mortalityFilters=None, covidFilters=None,
+                    cache_dir=cache_dir):
+    """load inputs and compute covid deduced mortality and excess mortality incrementally.
+
+    filter_mortality maps rows of the mortality file to weekly rows (Time, Year, KW, F-ANZ-1),
+    filter_covid selects the rows of the covid file to count. mortalityFilters and covidFilters
+    are applied while reading the files (see loading.read_csv_lean), files read in full go
+    through the feather cache in cache_dir. Returns
+    (data_mortalRate_df, data_covidCases_df, derived) with the derived frames by name.
+
+    The result is persisted in state_file, and the next call only processes rows appended
+    to the input files since then. A full recompute is done whenever earlier rows of an
+    input file were revised or the baseline years changed.
+    """
+    with stage("load state"):
+        state = _load_state(state_file)
+    sources = state.get("sources", {})
+    with stage("read appended mortality") as s:
+        data_mortalRate_df, mortalTail, mortalSource = read_appended(mortality_rate_file, parse_mortality_rate, sources.get("mortality"),
+                                                                     mortalityFilters, cache_dir)
+        s.rows = len(mortalTail) if mortalTail is not None else len(data_mortalRate_df)
+    with stage("read appended covid cases") as s:
+        data_covidCases_df, covidTail, covidSource = read_appended(covid_cases_file, parse_covid_cases, sources.get("covid"), covidFilters,
+                                                                 cache_dir)
+        s.rows = len(covidTail) if covidTail is not None else len(data_covidCases_df)
+
+    result = None
+    if mortalTail is not None and covidTail is not None and \
+            state.get("baselines") == (mortalityBaselineYear, mortalityBaselineYear_2):
+        with stage("extend derived"):
+            result = _extend_derived(state["derived"], state["excess"], filter_mortality(mortalTail),
+                                     covid_deaths_cum(filter_covid(covidTail)), mortalityBaselineYear, mortalityBaselineYear_2)
+    if result is None:
+        with stage("compute derived"):
+            result = _compute_derived(filter_mortality(data_mortalRate_df), covid_deaths_cum(filter_covid(data_covidCases_df)),
+                                      mortalityBaselineYear, mortalityBaselineYear_2)
+    derived, excess = result
+
+    with stage("save state"):
+        _save_state(state_file, {"sources": {"mortality": mortalSource, "covid": covidSource},
+                                 "baselines": (mortalityBaselineYear, mortalityBaselineYear_2),
+                                 "derived": derived, "excess": excess})
+    return data_mortalRate_df, data_covidCases_df, derived
@@ -0,0 +1,155 @@
+import os
+import sys
+import json
+import time
+import atexit
+import datetime
+
+try:
+    import resource
+except ImportError: # not available on windows, peak memory is not reported there
+    resource = None
+
+profileEnv = "ANALYSIS_PROFILE" # set to a json file name to write a stage report of the run
+
+###############################################################################
+# stages
+###############################################################################
+
+class _Stage:
+    # one measured stage, rows can be set inside the with block
+    __slots__ = ("name", "parent", "rows", "peak", "_wall", "_cpu", "_rss")
+
+    def __init__(self, name, parent):
+        self.name = name
+        self.parent = parent
+        self.rows = None
+        self.peak = None # peak RSS in kB while the stage is open, kept up to date by _rss_checkpoint
+
+    def __enter__(self):
+        self._rss = _rss_checkpoint()
+        self.peak = self._rss if _hwmReset else None
+        _stack.append(self)
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        rss = _rss_checkpoint()
+        _stack.pop()
+        _records.append({"stage": self.name, "parent": self.parent, "wall_s": round(wall, 6), "cpu_s": round(cpu, 6),
+                         "rss_start_mb": _mb(self._rss), "rss_end_mb": _mb(rss), "peak_rss_mb": _mb(self.peak), "rows": self.rows})
+        return False
+
+class _NoStage:
+    # used while instrumentation is disabled
+    __slots__ = ()
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+_noStage = _NoStage()
+_stack = []
+_records = []
+_report_file = None
+_processPeak = 0 # peak RSS in kB of the process, ru_maxrss is reset together with VmHWM
+_hwmReset = False # whether VmHWM could be reset, otherwise stages have no peak
+
+###############################################################################
+# memory
+###############################################################################
+
+def _mb(kb):
+    return round(kb / 1024, 1) if kb is not None else None
+
+def _read_status():
+    # (VmRSS, VmHWM) in kB of /proc/self/status, None if not available (not linux)
+    try:
+        with open("/proc/self/status") as f:
+            values = {line.split(":")[0]: int(line.split()[1]) for line in f if line.startswith(("VmRSS:", "VmHWM:"))}
+        return values["VmRSS"], values["VmHWM"]
+    except (OSError, KeyError, ValueError):
+        return None
+
+def _reset_hwm():
+    # reset VmHWM to the current RSS, so it holds the peak of the next interval only
+    global _hwmReset
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        _hwmReset = True
+    except OSError:
+        _hwmReset = False
+
+def _rss_checkpoint():
+    """current RSS in kB, the peak since the last checkpoint is added to all open stages.
+
+    On linux VmHWM is reset at each checkpoint, so each stage gets the peak while it
+    was open. Without /proc (not linux) memory of stages is None.
+    """
+    global _processPeak
+    status = _read_status()
+    if status is None:
+        return None
+    rss, hwm = status
+    _processPeak = max(_processPeak, hwm)
+    if _hwmReset:
+        for openStage in _stack:
+            openStage.peak = max(openStage.peak, hwm)
+    _reset_hwm()
+    return rss
+
+def _peak_rss_mb():
+    # peak RSS of the process
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak = round(peak / (1024*1024 if sys.platform == "darwin" else 1024), 1) # bytes on macOS, kB elsewhere
+    _rss_checkpoint()
+    return max(peak, _mb(_processPeak))
+
+def stage(name):
+    """context manager measuring wall time, cpu time and memory (RSS at start and end, peak) of a named stage.
+
+    Set .rows of the returned object to report the number of rows of its result.
+    Does nothing unless instrumentation is enabled.
+    """
+    if _report_file is None:
+        return _noStage
+    return _Stage(name, _stack[-1].name if _stack else None)
+
+###############################################################################
+# report
+###############################################################################
+
+def enable(report_file):
+    """record stages from now on and write them to report_file at exit."""
+    global _report_file
+    if _report_file is None:
+        atexit.register(write_report)
+    _report_file = report_file
+
+def write_report(report_file=None):
+    """write recorded stages as json report."""
+    report_file = report_file or _report_file
+    if report_file is None:
+        return
+    report = {"time": datetime.datetime.now().isoformat(timespec="seconds"),
+              "argv": sys.argv,
+              "python": sys.version.split()[0],
+              "peak_rss_mb": _peak_rss_mb(),
+              "stages": _records}
+    with open(report_file, "w") as f:
+        json.dump(report, f, indent=1)
+
+if os.environ.get(profileEnv):
+    enable(os.environ[profileEnv])
@@ -0,0 +1,256 @@
+import os
+import json
+import hashlib
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from analysis import decode_kalw
+from instrumentation import stage
+
+cache_dir = ".cache" # parsed inputs are stored here as feather files
+cache_version = 3 # increase when parsing changes, invalidates all cache entries
+
+# columns read from the OGD csv files and their dtypes, all other columns are skipped.
+# Code columns are categoricals, counts the smallest integer type that fits them.
+mortalityDtypes = {"C-KALWOCHE-0": "category", "C-BLWO-0": "category", "C-SEXWO-0": "category", "C-ALTER5-0": "category",
+                   "F-ANZ-1": np.float64}
+covidDtypes = {"Time": "category", "Altersgruppe": "category", "Bundesland": "category", "Geschlecht": "category",
+               "AnzahlTot": np.int32, "AltersgruppeID": np.int16}
+vaccDtypes = {"date": "category", "state_name": "category", "vaccine": "category", "dose_number": np.int8,
+              "doses_administered_cumulative": np.int32}
+readChunksize = 1 << 16 # rows per chunk if rows are filtered while reading
+
+###############################################################################
+# reading
+###############################################################################
+
+def concat_frames(frames):
+    """pd.concat of frames with the same columns, keeping categorical columns categorical.
+
+    pd.concat falls back to object columns if the categories of the frames differ,
+    here the categories are united first.
+    """
+    frames = list(frames)
+    if len(frames) == 1:
+        return frames[0]
+    dtypes = {column: pd.CategoricalDtype(union_categoricals([df[column] for df in frames], ignore_order=True).categories)
+              for column, dtype in frames[0].dtypes.items() if isinstance(dtype, pd.CategoricalDtype)}
+    return pd.concat([df.astype(dtypes) for df in frames])
+
+def _filter_mask(df, filters):
+    # rows with one of the allowed values in all filtered columns the frame has
+    mask = np.ones(len(df), dtype=bool)
+    for column, values in filters.items():
+        if column in df.columns:
+            mask &= df[column].isin(list(values)).to_numpy()
+    return mask
+
+def read_csv_lean(path, dtypes, filters=None, **read_csv_kwargs):
+    """pd.read_csv of the columns in dtypes, keeping only rows matching filters.
+
+    filters maps columns to their allowed values, filters of columns missing in the file
+    are ignored. With filters the file is read in chunks of readChunksize rows, so just one
+    chunk of unfiltered rows is held in memory.
+    """
+    read_csv_kwargs = dict(read_csv_kwargs, usecols=lambda column: column in dtypes, dtype=dtypes)
+    if not filters:
+        return pd.read_csv(path, **read_csv_kwargs)
+    chunks = [chunk.loc[_filter_mask(chunk, filters)] for chunk in pd.read_csv(path, chunksize=readChunksize, **read_csv_kwargs)]
+    return concat_frames(chunks).reset_index(drop=True)
+
+def _category_times(values, format, length=None):
+    # parse the categories only and broadcast them by the codes, missing values become NaT
+    categories = values.cat.categories.astype(str)
+    if length is not None:
+        categories = categories.str[0:length]
+    times = np.append(pd.to_datetime(categories, format=format).to_numpy(dtype="datetime64[ns]"), np.datetime64("NaT", "ns"))
+    return times[values.cat.codes.to_numpy()]
+
+###############################################################################
+# parsing of raw OGD csv files
+###############################################################################
+
+def parse_mortality_rate(path, filters=None, **read_csv_kwargs):
+    with stage("read_csv mortality") as s:
+        data_mortalRate_df = read_csv_lean(path, mortalityDtypes, filters, sep=";", decimal=",", **read_csv_kwargs)
+        s.rows = len(data_mortalRate_df)
+    # decode calendar weeks, due to KW issue, last week of 2020 is assigned to 2021
+    with stage("decode calendar weeks"):
+        kalw = data_mortalRate_df["C-KALWOCHE-0"]
+        years, kws, times = decode_kalw(kalw.cat.categories.to_numpy(dtype=str))
+        codes = kalw.cat.codes.to_numpy()
+    data_mortalRate_df["Year"] = years[codes]
+    data_mortalRate_df["KW"] = kws[codes]
+    data_mortalRate_df["Time"] = times[codes]
+    return data_mortalRate_df
+
+def parse_covid_cases(path, filters=None, **read_csv_kwargs):
+    with stage("read_csv covid cases") as s:
+        data_covidCases_df = read_csv_lean(path, covidDtypes, filters, sep=";", decimal=",", **read_csv_kwargs)
+        s.rows = len(data_covidCases_df)
+    with stage("parse covid dates"):
+        data_covidCases_df["Time"] = _category_times(data_covidCases_df["Time"], "%d.%m.%Y %H:%M:%S")
+    return data_covidCases_df
+
+###############################################################################
+# vaccination doses timeline, streamed
+###############################################################################
+
+class _HashingReader:
+    # file wrapper computing sha256 and length of everything read through it
+    def __init__(self, f):
+        self.f = f
+        self.sha = hashlib.sha256()
+        self.offset = 0
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.sha.update(data)
+        self.offset += len(data)
+        return data
+
+def concat_doses_cum(vaccDosesCums):
+    """join series of several read_vacc_doses_cum results, sorted by time per series."""
+    parts = {}
+    for vaccDosesCum in vaccDosesCums:
+        for key, series in vaccDosesCum.items():
+            parts.setdefault(key, []).append(series)
+    vaccDosesCum = {}
+    for key in sorted(parts):
+        times = np.concatenate([series[0] for series in parts[key]])
+        doses = np.concatenate([series[1] for series in parts[key]])
+        if len(times) > 1 and (np.diff(times) < np.timedelta64(0)).any():
+            order = np.argsort(times, kind="stable")
+            times, doses = times[order], doses[order]
+        vaccDosesCum[key] = (times, doses)
+    return vaccDosesCum
+
+def _ranks(names):
+    # rank of each name in sorted order
+    ranks = np.empty(len(names), dtype=np.int32)
+    ranks[np.argsort(np.array(names, dtype=str), kind="stable")] = np.arange(len(names))
+    return ranks
+
+def read_vacc_doses_cum(f, filters=None, **read_csv_kwargs):
+    """cumulated vaccine doses per (state_name, vaccine, dose_number) as (times, doses) arrays.
+
+    f (path or file object) is streamed in chunks of readChunksize rows, rows not matching
+    filters (e.g. {"state_name": ["Österreich"]}) are dropped and the dates of each chunk
+    are parsed per category. Only compact columns (key ids, datetime64[D], int32) of the
+    kept rows are collected, they are sorted by key and time and split into the series
+    once at the end, so the cost is linear in the rows whatever the number of series.
+    """
+    names = {"state_name": {}, "vaccine": {}} # ids of the names in order of appearance
+    parts = []
+    for chunk in pd.read_csv(f, sep=";", chunksize=readChunksize, usecols=lambda column: column in vaccDtypes, dtype=vaccDtypes,
+                             **read_csv_kwargs):
+        if filters:
+            chunk = chunk.loc[_filter_mask(chunk, filters)]
+        # ids of state and vaccine over all chunks, by the categories of this chunk (-1 for missing names)
+        ids = []
+        for column, columnIds in names.items():
+            categoryIds = np.array([columnIds.setdefault(str(name), len(columnIds)) for name in chunk[column].cat.categories] + [-1],
+                                   dtype=np.int32)
+            ids.append(categoryIds[chunk[column].cat.codes.to_numpy()])
+        rows = (ids[0] >= 0) & (ids[1] >= 0)
+        times = _category_times(chunk["date"], "%Y-%m-%d", 10).astype("datetime64[D]")
+        parts.append((ids[0][rows], ids[1][rows], chunk["dose_number"].to_numpy()[rows], times[rows],
+                      chunk["doses_administered_cumulative"].to_numpy()[rows]))
+    if not parts:
+        return {}
+    stateIds, vaccineIds, doseNumbers, times, doses = (np.concatenate(arrays) for arrays in zip(*parts))
+
+    # series in order of their keys (state name, vaccine name, dose number), each sorted by time
+    stateNames, vaccineNames = sorted(names["state_name"]), sorted(names["vaccine"])
+    stateRanks = _ranks(list(names["state_name"]))[stateIds]
+    vaccineRanks = _ranks(list(names["vaccine"]))[vaccineIds]
+    order = np.lexsort((times, doseNumbers, vaccineRanks, stateRanks))
+    stateRanks, vaccineRanks, doseNumbers = stateRanks[order], vaccineRanks[order], doseNumbers[order]
+    starts = np.flatnonzero(np.diff(stateRanks) != 0) + 1
+    starts = np.union1d(starts, np.flatnonzero(np.diff(vaccineRanks) != 0) + 1)
+    starts = np.union1d(starts, np.flatnonzero(np.diff(doseNumbers) != 0) + 1)
+    keys = [(stateNames[stateRanks[start]], vaccineNames[vaccineRanks[start]], int(doseNumbers[start]))
+            for start in np.concatenate([[0], starts]).astype(int)] if len(order) else []
+    return dict(zip(keys, zip(np.split(times[order], starts), np.split(doses[order], starts))))
+
+def stream_vacc_doses_cum(path, filters=None):
+    """read_vacc_doses_cum of path, also returning (offset, sha256) of the bytes read."""
+    with open(path, "rb") as f:
+        reader = _HashingReader(f)
+        with stage("stream vaccination doses") as s:
+            vaccDosesCum = read_vacc_doses_cum(reader, filters)
+            s.rows = sum(len(series[0]) for series in vaccDosesCum.values())
+    return vaccDosesCum, reader.offset, reader.sha.hexdigest()
+
+###############################################################################
+# cache
+###############################################################################
+
+def _file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+def load_cached(path, parse, cache_dir=cache_dir, filters=None):
+    """return parse(path, filters), cached as feather file in cache_dir.
+
+    A cache entry is valid as long as size and mtime of path are unchanged, or the
+    content hash is unchanged (e.g. same export downloaded again). Otherwise the
+    file is parsed again and the entry is replaced. Each set of filters has its own entry.
+    """
+    try:
+        from pyarrow import feather
+    except ImportError: # cache is optional, without pyarrow the csv files are parsed on every run
+        return parse(path, filters)
+    name = f"{os.path.basename(path)}.{parse.__name__}"
+    if filters:
+        name += "." + hashlib.sha256(json.dumps(filters, sort_keys=True).encode()).hexdigest()[0:16]
+    data_file = os.path.join(cache_dir, name + ".feather")
+    meta_file = os.path.join(cache_dir, name + ".json")
+
+    stat = os.stat(path)
+    key = {"version": cache_version, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    try:
+        with open(meta_file) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = {}
+    if os.path.exists(data_file) and meta.get("version") == key["version"] and meta.get("size") == key["size"]:
+        if meta.get("mtime_ns") != key["mtime_ns"]:
+            key["sha256"] = _file_hash(path)
+            if meta.get("sha256") == key["sha256"]:
+                _write_meta(meta_file, key)
+        else:
+            key["sha256"] = meta.get("sha256")
+        if meta.get("sha256") == key["sha256"]:
+            with stage(f"cache read {parse.__name__}") as s:
+                df = feather.read_table(data_file, memory_map=True).to_pandas()
+                s.rows = len(df)
+            return df
+
+    # cache miss: parse and store
+    df = parse(path, filters)
+    with stage(f"cache write {parse.__name__}"):
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = f"{data_file}.{os.getpid()}.tmp" # per process, runs on the same file may overlap
+        feather.write_feather(df.reset_index(drop=True), tmp_file, compression="uncompressed")
+        os.replace(tmp_file, data_file)
+    key["sha256"] = key.get("sha256") or _file_hash(path)
+    _write_meta(meta_file, key)
+    return df
+
+def _write_meta(meta_file, key):
+    tmp_file = f"{meta_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(key, f)
+    os.replace(tmp_file, meta_file)
+
+def load_mortality_rate(path, cache_dir=cache_dir, filters=None):
+    return load_cached(path, parse_mortality_rate, cache_dir, filters)
+
+def load_covid_cases(path, cache_dir=cache_dir, filters=None):
+    return load_cached(path, parse_covid_cases, cache_dir, filters)
@@ -0,0 +1,197 @@
+import os
+import json
+import pickle
+import hashlib
+import datetime
+import multiprocessing
+
+import numpy as np
+
+from analysis import year_rows
+from engine import regionNames
+from instrumentation import stage
+
+renderVersion = 1 # increase when drawing changes, all figures are rendered again
+
+###############################################################################
+# figure data
+###############################################################################
+
+def _cum_per_year(df, column, years):
+    # one line per year, cumulated deaths over the calendar weeks, weeks are sorted by year
+    lines = []
+    allYears = df["Year"].to_numpy()
+    kws = df["KW"].to_numpy()
+    values = df[column].to_numpy()
+    for year in np.unique(allYears[year_rows(allYears, years)]):
+        rows = year_rows(allYears, [year])
+        lines.append({"label": str(year), "x": kws[rows], "y": values[rows].cumsum()})
+    return lines
+
+def _vacc_lines(vaccDosesCum, stateName):
+    # one line per vaccine and dose of the state, keys are sorted
+    return [{"label": f"{vaccine} {doseNumber}", "x": times, "y": doses}
+            for (state, vaccine, doseNumber), (times, doses) in vaccDosesCum.items() if state == stateName]
+
+def figure_specs(inputs, result, config, mortalityYlim=[0, 90000], covidDeathsYlim=[0, 18000], excessYlim=[0, 19000],
+                 plotDeathsByAge=True):
+    """data of all figures of one analysis (result of engine.run_analysis) by figure name.
+
+    All series are precomputed, a figure spec only holds arrays, labels and limits
+    and is drawn by draw_figure.
+    """
+    with stage("figure data") as s:
+        figures = _figure_specs(inputs, result, config, mortalityYlim, covidDeathsYlim, excessYlim, plotDeathsByAge)
+        s.rows = len(figures)
+    return figures
+
+def _figure_specs(inputs, result, config, mortalityYlim, covidDeathsYlim, excessYlim, plotDeathsByAge):
+    data_mortalRate_df_filtered = result["data_mortalRate_df_filtered"]
+    covidDeathsCum_df = result["covidDeathsCum_df"]
+    data_mortalRate_df_filtered_CovidYears = result["data_mortalRate_df_filtered_CovidYears"]
+    data_mortalRate_df_filtered_vaccYear = result["data_mortalRate_df_filtered_vaccYear"]
+    # years to compare in the mortality figures
+    lastYears = [2016,2017,2018,2019,2020,2021]
+    covidDeaths = {"label": "CovidDeathsCum", "x": covidDeathsCum_df["Time"].to_numpy(), "y": covidDeathsCum_df["CovidDeathsCum"].to_numpy()}
+    vaccLines = []
+    if inputs.vaccDosesCum is not None:
+        vaccLines = _vacc_lines(inputs.vaccDosesCum, regionNames[config.region])
+
+    figures = {}
+    # plot raw data
+    figures["mortality_last_years"] = {"title": "mortality of last years", "xlabel": "KW", "ylabel": "deaths", "ylim": mortalityYlim,
+                                       "lines": _cum_per_year(data_mortalRate_df_filtered, "F-ANZ-1", lastYears)}
+    figures["covid_deaths"] = {"title": "cumulated covid deaths", "xlabel": "Time", "ylabel": "deaths", "ylim": covidDeathsYlim,
+                               "lines": [covidDeaths]}
+    if plotDeathsByAge:
+        covidDeathsByAgeCum_df = result["covidDeathsByAgeCum_df"]
+        figures["covid_deaths_by_age"] = {"title": f"covid deaths by age, until {inputs.data_covidCases_df['Time'].max()}",
+                                          "xlabel": "Altersgruppe", "ylabel": "deaths",
+                                          "bars": {"label": "AnzahlTot", "x": covidDeathsByAgeCum_df["Altersgruppe"].astype(str).to_numpy(),
+                                                   "y": covidDeathsByAgeCum_df["AnzahlTot"].to_numpy()}}
+    if vaccLines:
+        figures["vaccination_progress"] = {"title": "vaccination progress", "xlabel": "Time", "ylabel": "vaccine doses", "ylim": [0, 8e6],
+                                           "lines": vaccLines}
+    # plot excess mortalility vs. covid deaths
+    figures["excess_vs_covid_deaths"] = {"title": "excess mortality vs. covid deaths", "xlabel": "Time", "ylabel": "deaths", "ylim": excessYlim,
+                                         "xlim": [datetime.datetime(2020,1,1), datetime.datetime(2021,12,31)],
+                                         "lines": [covidDeaths,
+                                                   {"label": f"excess mortality, cumulated, baseline {config.mortalityBaselineYear}",
+                                                    "x": data_mortalRate_df_filtered_CovidYears["Time"].to_numpy(),
+                                                    "y": data_mortalRate_df_filtered_CovidYears["excessmortalCum"].to_numpy(),
+                                                    "style": {"color": "#BB0000"}}]}
+    # plot cleaned mortabilities
+    figures["mortality_deduced"] = {"title": "mortality, deduced covid deaths", "xlabel": "KW", "ylabel": "deaths", "ylim": mortalityYlim,
+                                    "lines": _cum_per_year(data_mortalRate_df_filtered, "F_ANZ_cleanedByCovidDeaths", lastYears)}
+    # plot excess mortalility of vacc year, compare cleaned data (excluded covid deaths)
+    figures["excess_vs_vaccination"] = {"title": "excess mortality (deduced covid deaths) vs. vaccination progress",
+                                        "xlabel": "Time", "ylabel": "deaths", "legend": "upper left",
+                                        "xlim": [datetime.datetime(2021,1,1), datetime.datetime(2021,12,31)],
+                                        "lines": [{"label": f"excess mortality, Covid deaths deducted, cumulated, baseline {config.mortalityBaselineYear_2}",
+                                                   "x": data_mortalRate_df_filtered_vaccYear["Time"].to_numpy(),
+                                                   "y": data_mortalRate_df_filtered_vaccYear["excessmortalCum"].to_numpy(),
+                                                   "style": {"color": "b", "marker": "o"}}],
+                                        "twin": {"ylabel": "vaccine doses", "ylim": [0, 8e6], "lines": vaccLines}}
+    return figures
+
+###############################################################################
+# drawing
+###############################################################################
+
+def _draw_lines(ax, lines, ylim=None):
+    for line in lines:
+        ax.plot(line["x"], line["y"], label=line["label"], **line.get("style", {}))
+    if ylim is not None:
+        ax.set_ylim(ylim)
+    if lines:
+        ax.legend()
+
+def draw_figure(fig, spec):
+    """draw a figure spec of figure_specs on a matplotlib figure."""
+    ax = fig.subplots()
+    _draw_lines(ax, spec.get("lines", []), spec.get("ylim"))
+    if "bars" in spec:
+        ax.bar(spec["bars"]["x"], spec["bars"]["y"], label=spec["bars"]["label"])
+        ax.tick_params(axis="x", labelrotation=90)
+        ax.legend()
+    if "legend" in spec:
+        ax.legend(loc=spec["legend"])
+    ax.grid(True)
+    if "twin" in spec:
+        ax2 = ax.twinx()
+        _draw_lines(ax2, spec["twin"]["lines"], spec["twin"].get("ylim"))
+        ax2.set_ylabel(spec["twin"]["ylabel"])
+    ax.set_title(spec["title"])
+    ax.set_xlabel(spec["xlabel"])
+    ax.set_ylabel(spec["ylabel"])
+    if "xlim" in spec:
+        ax.set_xlim(left=spec["xlim"][0], right=spec["xlim"][1])
+    if spec["xlabel"] == "Time":
+        fig.autofmt_xdate()
+    return fig
+
+def show_figures(figures):
+    """draw figures interactively with pyplot."""
+    with stage("draw figures") as s:
+        from matplotlib import pyplot
+        for spec in figures.values():
+            draw_figure(pyplot.figure(), spec)
+        s.rows = len(figures)
+
+###############################################################################
+# headless rendering
+###############################################################################
+
+def figure_hash(spec, formats):
+    return hashlib.sha256(pickle.dumps((renderVersion, formats, spec), protocol=4)).hexdigest()
+
+def _render(args):
+    # draws on a figure with the Agg canvas, without pyplot and its global state
+    name, spec, output_dir, formats = args
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    draw_figure(fig, spec)
+    for fmt in formats:
+        fig.savefig(os.path.join(output_dir, f"{name}.{fmt}"), format=fmt)
+    return name
+
+def render_figures(figures, output_dir, formats=("png", "svg"), processes=None):
+    """write figures as files to output_dir, rendered in parallel worker processes.
+
+    Figures whose data did not change since the last call (hashes are kept in
+    output_dir/figures.json) and whose files exist are skipped. Returns the names of
+    rendered figures. Scripts calling this need an if __name__ == "__main__" guard,
+    called from a worker process (e.g. a script imported by spawned workers) the
+    figures are rendered serially.
+    """
+    formats = tuple(formats)
+    os.makedirs(output_dir, exist_ok=True)
+    index_file = os.path.join(output_dir, "figures.json")
+    try:
+        with open(index_file) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+
+    hashes = {name: figure_hash(spec, formats) for name, spec in figures.items()}
+    tasks = [(name, spec, output_dir, formats) for name, spec in figures.items()
+             if index.get(name) != hashes[name] or
+                not all(os.path.exists(os.path.join(output_dir, f"{name}.{fmt}")) for fmt in formats)]
+    processes = min(processes or os.cpu_count(), len(tasks))
+    if multiprocessing.parent_process() is not None or getattr(multiprocessing.current_process(), "_inheriting", False):
+        processes = 1 # no pool in a worker process, or while a spawned worker imports the main script
+    with stage("render figures") as s:
+        if processes <= 1:
+            rendered = [_render(task) for task in tasks]
+        else:
+            with multiprocessing.Pool(processes) as pool:
+                rendered = pool.map(_render, tasks)
+        s.rows = len(rendered)
+
+    index.update({name: hashes[name] for name in rendered})
+    with open(index_file + ".tmp", "w") as f:
+        json.dump(index, f, indent=1)
+    os.replace(index_file + ".tmp", index_file)
+    return rendered